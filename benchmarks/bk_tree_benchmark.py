@@ -0,0 +1,96 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wallpaper_finder.bk_tree import BKTree, hamming_distance  # noqa: E402
+
+HASH_BITS = 100
+
+
+def arguments() -> dict:
+    """
+    Console arguments.
+    """
+    parser = argparse.ArgumentParser(description="Measures BK-tree lookup time against index size.")
+
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        type=int,
+        default=[1000, 10000, 50000, 100000],
+        nargs="+",
+        help="Index sizes to measure."
+    )
+
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=int,
+        default=5,
+        help="Max Hamming distance of a lookup."
+    )
+
+    parser.add_argument(
+        "-q",
+        "--queries",
+        type=int,
+        default=1000,
+        help="Number of lookups for every size."
+    )
+
+    return vars(parser.parse_args())
+
+
+def random_hash() -> int:
+    return random.getrandbits(HASH_BITS)
+
+
+def flip_bits(value: int, count: int) -> int:
+    for bit in random.sample(range(HASH_BITS), count):
+        value ^= 1 << bit
+
+    return value
+
+
+def linear_find(hashes: list, query: int, threshold: int) -> bool:
+    return any(hamming_distance(query, h) <= threshold for h in hashes)
+
+
+def main(sizes: list, threshold: int, queries: int) -> None:
+    random.seed(0)
+
+    print(f"{'size':>8} {'build, s':>10} {'bk-tree, us':>12} {'linear, us':>11}")
+
+    for size in sizes:
+        hashes = [random_hash() for _ in range(size)]
+
+        start = time.perf_counter()
+        tree = BKTree()
+        for i, h in enumerate(hashes):
+            tree.add(format(h, "x"), i)
+        build_time = time.perf_counter() - start
+
+        # Half of the queries are near duplicates of indexed hashes.
+        lookups = [flip_bits(random.choice(hashes), random.randint(0, threshold))
+                   if i % 2 else random_hash() for i in range(queries)]
+
+        start = time.perf_counter()
+        for query in lookups:
+            tree.find(format(query, "x"), threshold)
+        tree_time = (time.perf_counter() - start) / queries * 1e6
+
+        linear_lookups = lookups[:max(1, queries // 10)]
+        start = time.perf_counter()
+        for query in linear_lookups:
+            linear_find(hashes, query, threshold)
+        linear_time = (time.perf_counter() - start) / len(linear_lookups) * 1e6
+
+        print(f"{size:>8} {build_time:>10.2f} {tree_time:>12.1f} {linear_time:>11.1f}")
+
+
+if __name__ == "__main__":
+    main(**arguments())
@@ -0,0 +1,222 @@
+import argparse
+import json
+import socket
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image
+
+# Host names of the mock server, resolved to 127.0.0.1 by 'override_hosts'.
+# Image host starts with "i." as image hosts of reddit do.
+LISTING_HOST = "www.mock-reddit.test"
+IMAGE_HOST = "i.mock-reddit.test"
+
+FORMATS = {"jpg": "JPEG", "png": "PNG"}
+
+# Bytes written at once when bandwidth is limited.
+WRITE_CHUNK_SIZE = 16 * 1024
+
+
+def make_image(index: int, width: int, height: int, image_format: str) -> bytes:
+    """
+    Returns encoded gradient image, images with different 'index' have different hashes.
+    """
+    gradient = Image.linear_gradient("L").resize((width, height))
+
+    # Every image gets its own orientation and colors.
+    gradient = gradient.rotate(index * 37 % 360, expand=False)
+    image = Image.merge("RGB", (gradient,
+                                gradient.point(lambda v: (v + index * 53) % 256),
+                                gradient.point(lambda v: 255 - v)))
+
+    output = BytesIO()
+    image.save(output, FORMATS[image_format])
+
+    return output.getvalue()
+
+
+class MockRedditServer:
+    def __init__(self, port: int = 0, posts: int = 200, unique_images: int = 50,
+                 sizes: list = ((1920, 1080), (2560, 1440)), formats: list = ("jpg", ),
+                 latency: float = 0.0, bandwidth: float = None) -> None:
+        """
+        Local stand-in for reddit listings and image hosts.
+
+        Every subreddit has 'posts' submissions with direct image links. Images are
+        generated once, post number N links to image N % 'unique_images', so other
+        posts are duplicates.
+
+        latency: seconds before every response.
+        bandwidth: bytes per second of every image response, None - not limited.
+        """
+        self.posts = posts
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+        self.images = {}
+        for index in range(unique_images):
+            width, height = sizes[index % len(sizes)]
+            image_format = formats[index % len(formats)]
+
+            self.images[f"{index}.{image_format}"] = (make_image(index, width, height, image_format),
+                                                      width, height)
+
+        self.image_names = sorted(self.images, key=lambda name: int(name.split(".")[0]))
+
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+        self._thread = None
+
+    def get_listing_url(self, subreddit: str, sort_type: str) -> str:
+        return f"http://{LISTING_HOST}:{self.port}/r/{subreddit}/{sort_type}.json"
+
+    def make_listing(self, subreddit: str, limit: int, after: str) -> dict:
+        start = 0 if after in ("null", "") else int(after)
+        end = min(start + limit, self.posts)
+
+        children = []
+        for number in range(start, end):
+            name = self.image_names[number % len(self.image_names)]
+            _, width, height = self.images[name]
+
+            children.append({"kind": "t3",
+                             "data": {"id": f"{subreddit}{number}",
+                                      "subreddit": subreddit,
+                                      "score": self.posts - number,
+                                      "url": f"http://{IMAGE_HOST}:{self.port}/{subreddit}-{number}-{name}",
+                                      "preview": {"images": [{"source": {"width": width,
+                                                                         "height": height}}]}}})
+
+        return {"kind": "Listing",
+                "data": {"after": str(end) if end < self.posts else None,
+                         "children": children}}
+
+    def _make_handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                time.sleep(server.latency)
+
+                url = urlparse(self.path)
+
+                if url.path.endswith(".json"):
+                    query = parse_qs(url.query)
+                    listing = server.make_listing(url.path.split("/")[2],
+                                                  int(query.get("limit", ["25"])[0]),
+                                                  query.get("after", ["null"])[0])
+
+                    self.send_body(json.dumps(listing).encode(), "application/json")
+                    return
+
+                # /<subreddit>-<number>-<image name>
+                name = url.path.rsplit("-", 1)[-1]
+                if name not in server.images:
+                    self.send_error(404)
+                    return
+
+                content, _, _ = server.images[name]
+                self.send_body(content, "image/" + name.split(".")[1], server.bandwidth)
+
+            def send_body(self, body: bytes, content_type: str, bandwidth: float = None) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+
+                try:
+                    if not bandwidth:
+                        self.wfile.write(body)
+                    else:
+                        for start in range(0, len(body), WRITE_CHUNK_SIZE):
+                            chunk = body[start:start + WRITE_CHUNK_SIZE]
+                            self.wfile.write(chunk)
+                            time.sleep(len(chunk) / bandwidth)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client stopped loading, e.g. image was rejected by its header.
+                    return
+
+                with server._lock:
+                    server.bytes_sent += len(body)
+
+        return Handler
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "MockRedditServer":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+
+class override_hosts:
+    """
+    Resolves mock host names to 127.0.0.1 in this process, other names are resolved as usual.
+    """
+    hosts = (LISTING_HOST, IMAGE_HOST)
+
+    def __enter__(self) -> None:
+        self._getaddrinfo = socket.getaddrinfo
+
+        def getaddrinfo(host, *args, **kwargs):
+            if host in self.hosts:
+                host = "127.0.0.1"
+
+            return self._getaddrinfo(host, *args, **kwargs)
+
+        socket.getaddrinfo = getaddrinfo
+
+    def __exit__(self, *args) -> None:
+        socket.getaddrinfo = self._getaddrinfo
+
+
+def arguments() -> dict:
+    """
+    Console arguments.
+    """
+    parser = argparse.ArgumentParser(description="Serves generated reddit listings and images. "
+                                                 f"Map {LISTING_HOST} and {IMAGE_HOST} to 127.0.0.1 "
+                                                 "in hosts file to use it with wallpaper finder.")
+
+    parser.add_argument("-p", "--port", type=int, default=8080, help="Port to listen on.")
+    parser.add_argument("--posts", type=int, default=200, help="Submissions in every subreddit.")
+    parser.add_argument("--unique-images", type=int, default=50, help="Number of different images.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before every response.")
+    parser.add_argument("--bandwidth", type=float, default=None,
+                        help="Bytes per second of every image response.")
+
+    return vars(parser.parse_args())
+
+
+if __name__ == "__main__":
+    args = arguments()
+
+    server = MockRedditServer(**args)
+    print(f"Listing url: {server.get_listing_url('wallpaper', 'top')}")
+
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,238 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wallpaper_finder import FileUtils, HttpSession, RateLimiter, RedditPicturesLoader  # noqa: E402
+from wallpaper_finder.async_loader import AsyncImageLoader  # noqa: E402
+from wallpaper_finder.metrics import percentile  # noqa: E402
+
+from mock_reddit_server import MockRedditServer, override_hosts  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is not reported.
+    resource = None
+
+RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def arguments() -> dict:
+    """
+    Console arguments.
+    """
+    parser = argparse.ArgumentParser(description="Measures load, hash, dedupe and move stages "
+                                                 "against a local mock of reddit.")
+
+    parser.add_argument("-s", "--subreddits", type=int, default=2, help="Number of subreddits.")
+    parser.add_argument("-l", "--limit", type=int, default=200, help="Submissions per subreddit.")
+    parser.add_argument("--unique-images", type=int, default=50,
+                        help="Number of different images, other submissions link to duplicates.")
+    parser.add_argument("--sizes", type=str, default=["1920x1080", "2560x1440", "3840x2160"],
+                        nargs="+", help="Resolutions of generated images.")
+    parser.add_argument("--formats", type=str, default=["jpg", "png"], nargs="+",
+                        help="Formats of generated images.")
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="Seconds before every response of the mock server.")
+    parser.add_argument("--bandwidth", type=float, default=None,
+                        help="Bytes per second of every image response, not limited by default.")
+    parser.add_argument("-nt", "--number-of-threads", type=int, default=FileUtils.number_of_threads)
+    parser.add_argument("-de", "--download-engine", type=str, default=FileUtils.download_engine)
+    parser.add_argument("-np", "--number-of-processes", type=int, default=None)
+    parser.add_argument("-pt", "--pass-through", action="store_true")
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="File for JSON results, by default a new file in benchmarks/results.")
+
+    return vars(parser.parse_args())
+
+
+def stage_result(seconds: float, items: int, size: int = None, latencies: list = None) -> dict:
+    result = {"seconds": round(seconds, 4),
+              "items": items,
+              "images_per_second": round(items / seconds, 2) if seconds else None}
+
+    if size is not None:
+        result["megabytes_per_second"] = round(size / 1024 ** 2 / seconds, 2) if seconds else None
+
+    if latencies is not None:
+        latencies = sorted(latencies)
+        result["p50_ms"] = round(percentile(latencies, 50) * 1000, 2) if latencies else None
+        result["p95_ms"] = round(percentile(latencies, 95) * 1000, 2) if latencies else None
+
+    return result
+
+
+def get_folder_size(paths: list) -> int:
+    return sum(os.path.getsize(path) for path in paths)
+
+
+def get_peak_rss() -> dict:
+    """
+    Returns peak resident memory in MB of this process and of finished child processes.
+    """
+    if resource is None:
+        return None
+
+    # Kilobytes on Linux, bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+
+    return {"self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1024 ** 2, 1),
+            "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1024 ** 2, 1)}
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def time_downloads(latencies: list) -> None:
+    """
+    Records time of every image download of both engines to 'latencies'.
+    """
+    save_image_from_url = FileUtils.save_image_from_url
+    save_image_from_url_async = AsyncImageLoader.save_image_from_url
+
+    def timed(url: str, file_path: str):
+        start = time.perf_counter()
+        try:
+            return save_image_from_url(url, file_path)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    async def timed_async(self, session, url: str, file_path: str):
+        start = time.perf_counter()
+        try:
+            return await save_image_from_url_async(self, session, url, file_path)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    FileUtils.save_image_from_url = timed
+    AsyncImageLoader.save_image_from_url = timed_async
+
+
+def run(server: MockRedditServer, subreddits: list, limit: int, work_folder: str) -> dict:
+    stages = {}
+
+    temp_folder = os.path.join(work_folder, "temp")
+    save_folder = os.path.join(work_folder, "saved")
+    FileUtils.set_temp_folder_path(temp_folder)
+    FileUtils.set_save_folder_path(save_folder)
+
+    class MockLoader(RedditPicturesLoader):
+        def make_request_url(self, subreddit_name: str) -> str:
+            return server.get_listing_url(subreddit_name, self.sort_type)
+
+    loader = MockLoader(subreddits=subreddits, limit=limit)
+
+    # Load
+    latencies = []
+    time_downloads(latencies)
+
+    start = time.perf_counter()
+    image_paths = loader.load_pictures(subreddits)
+    seconds = time.perf_counter() - start
+
+    stages["load_pictures"] = stage_result(seconds, len(image_paths), server.bytes_sent, latencies)
+    stages["load_pictures"]["errors"] = len(loader.errors)
+
+    size = get_folder_size(image_paths)
+
+    # Hash of a single image
+    latencies = []
+    start = time.perf_counter()
+    for image_path in image_paths:
+        image_start = time.perf_counter()
+        FileUtils.ahash(image_path)
+        latencies.append(time.perf_counter() - image_start)
+    stages["ahash"] = stage_result(time.perf_counter() - start, len(image_paths), size, latencies)
+
+    # Half of the downloaded images are already in the save folder.
+    for image_path in image_paths[::2]:
+        shutil.copy(image_path, save_folder)
+
+    # Hashes of all images, hashes remembered while loading are not used.
+    FileUtils.image_hashes.clear()
+    start = time.perf_counter()
+    FileUtils.calculate_hashes(image_paths)
+    stages["calculate_hashes"] = stage_result(time.perf_counter() - start, len(image_paths), size)
+
+    FileUtils.image_hashes.clear()
+    start = time.perf_counter()
+    images_to_save, _ = FileUtils.find_duplicates(image_paths, save_folder, "downloaded images")
+    stages["find_duplicates"] = stage_result(time.perf_counter() - start, len(image_paths), size)
+
+    # The second search uses hash index of the save folder.
+    FileUtils.image_hashes.clear()
+    start = time.perf_counter()
+    FileUtils.find_duplicates(image_paths, save_folder, "downloaded images")
+    stages["find_duplicates_indexed"] = stage_result(time.perf_counter() - start, len(image_paths), size)
+
+    size = get_folder_size(images_to_save)
+    start = time.perf_counter()
+    FileUtils.move_images(images_to_save, save_folder)
+    stages["move_images"] = stage_result(time.perf_counter() - start, len(images_to_save), size)
+
+    return stages
+
+
+def main(subreddits: int, limit: int, unique_images: int, sizes: list, formats: list,
+         latency: float, bandwidth: float, number_of_threads: int, download_engine: str,
+         number_of_processes: int, pass_through: bool, output: str) -> None:
+    parameters = dict(locals())
+    del parameters["output"]
+
+    FileUtils.set_number_of_threads(number_of_threads)
+    FileUtils.set_download_engine(download_engine)
+    FileUtils.set_number_of_processes(number_of_processes)
+    FileUtils.set_pass_through(pass_through)
+    FileUtils.set_extensions(["." + image_format for image_format in formats])
+
+    HttpSession.configure(max(number_of_threads, subreddits))
+    # Mock server has no rate limits.
+    RateLimiter.configure(10 ** 6)
+    RateLimiter.burst = 10 ** 6
+
+    sizes = [tuple(int(v) for v in size.split("x")) for size in sizes]
+
+    print("Generating images...")
+    with MockRedditServer(posts=limit, unique_images=unique_images, sizes=sizes, formats=formats,
+                          latency=latency, bandwidth=bandwidth) as server, \
+            override_hosts(), tempfile.TemporaryDirectory() as work_folder:
+
+        stages = run(server, [f"bench{i}" for i in range(subreddits)], limit, work_folder)
+
+    results = {"commit": get_commit(),
+               "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "parameters": parameters,
+               "stages": stages,
+               "peak_rss_mb": get_peak_rss()}
+
+    print(f"\n{'stage':<24} {'seconds':>8} {'images/s':>9} {'MB/s':>8} {'p50, ms':>8} {'p95, ms':>8}")
+    for name, stage in stages.items():
+        print(f"{name:<24} {stage['seconds']:>8} {stage['images_per_second'] or '-':>9} "
+              f"{stage.get('megabytes_per_second') or '-':>8} "
+              f"{stage.get('p50_ms') or '-':>8} {stage.get('p95_ms') or '-':>8}")
+    print(f"peak RSS, MB: {results['peak_rss_mb']}")
+
+    if output is None:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        output = os.path.join(RESULTS_FOLDER, f"pipeline-{results['commit']}-{int(time.time())}.json")
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
+
+    print(f"Results are saved to {output}")
+
+
+if __name__ == "__main__":
+    main(**arguments())
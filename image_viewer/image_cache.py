@@ -0,0 +1,133 @@
+from PyQt5.QtCore import Qt, QObject, QRunnable, QSize, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader
+
+from collections import OrderedDict
+
+from typing import Optional
+
+
+def readImage(filePath: str, maxSize: QSize = None) -> QImage:
+    """
+    Decodes image located at filePath, image bigger than maxSize is decoded at lower resolution.
+    """
+    reader = QImageReader(filePath)
+
+    size = reader.size()
+    if maxSize and size.isValid() and (size.width() > maxSize.width() or
+                                       size.height() > maxSize.height()):
+        # Jpeg decoder skips pixels it doesn't need, other formats are scaled after decoding.
+        reader.setScaledSize(size.scaled(maxSize, Qt.KeepAspectRatio))
+
+    return reader.read()
+
+
+class ImageLoaderSignals(QObject):
+    """
+    Signals of ImageLoaderTask, QRunnable can't have its own.
+    """
+    loaded = pyqtSignal(str, QImage)
+
+
+class ImageLoaderTask(QRunnable):
+    def __init__(self, filePath: str, maxSize: QSize = None) -> None:
+        """
+        Decodes image located at filePath in a thread of QThreadPool.
+        """
+        QRunnable.__init__(self)
+
+        self.filePath = filePath
+        self.maxSize = maxSize
+        self.signals = ImageLoaderSignals()
+
+    def run(self) -> None:
+        image = readImage(self.filePath, self.maxSize)
+        self.signals.loaded.emit(self.filePath, image)
+
+
+class ImageCache(QObject):
+    # Emitted with path of every image put to the cache.
+    imageCached = pyqtSignal(str)
+
+    def __init__(self, maxBytes: int, threads: int, taskClass: type = ImageLoaderTask) -> None:
+        """
+        LRU cache of decoded images, images are prefetched in background threads.
+
+        maxBytes: cache is limited by this number of bytes of decoded pixels.
+        threads: number of threads that prefetch images.
+        taskClass: ImageLoaderTask or its subclass that decodes images.
+        """
+        QObject.__init__(self)
+
+        self.taskClass = taskClass
+        self.maxBytes = maxBytes
+        self.usedBytes = 0
+
+        # Path -> QImage, the most recently used are at the end.
+        self.images = OrderedDict()
+
+        # Paths that are being decoded and paths that can't be decoded.
+        self.pending = set()
+        self.failed = set()
+
+        self.threadPool = QThreadPool(self)
+        self.threadPool.setMaxThreadCount(threads)
+
+    def get(self, filePath: str) -> Optional[QImage]:
+        """
+        Returns cached image and marks it as recently used.
+        """
+        image = self.images.get(filePath)
+
+        if image is not None:
+            self.images.move_to_end(filePath)
+
+        return image
+
+    def put(self, filePath: str, image: QImage) -> None:
+        """
+        Caches image, least recently used images are removed to fit in 'maxBytes'.
+        """
+        self.pending.discard(filePath)
+
+        if image.isNull():
+            self.failed.add(filePath)
+            return
+
+        if filePath in self.images:
+            return
+
+        self.images[filePath] = image
+        self.usedBytes += image.sizeInBytes()
+
+        # The newest image is kept even if it doesn't fit.
+        while self.usedBytes > self.maxBytes and len(self.images) > 1:
+            _, removedImage = self.images.popitem(last=False)
+            self.usedBytes -= removedImage.sizeInBytes()
+
+        self.imageCached.emit(filePath)
+
+    def prefetch(self, filePaths: list, maxSize: QSize = None) -> None:
+        """
+        Decodes images that are not cached in background threads, at most at maxSize.
+        """
+        for filePath in filePaths:
+            if filePath in self.images or filePath in self.pending or filePath in self.failed:
+                continue
+
+            self.pending.add(filePath)
+
+            task = self.taskClass(filePath, maxSize)
+            # Images are put to the cache in the thread of this object.
+            task.signals.loaded.connect(self.put)
+            self.threadPool.start(task)
+
+    def clear(self) -> None:
+        """
+        Removes all images and cancels prefetching that hasn't started.
+        """
+        self.threadPool.clear()
+
+        self.images.clear()
+        self.pending.clear()
+        self.failed.clear()
+        self.usedBytes = 0
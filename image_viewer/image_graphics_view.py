@@ -1,10 +1,11 @@
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QSize
 from PyQt5.QtWidgets import QGraphicsScene, QGraphicsView
 from PyQt5.QtGui import QImage, QPixmap
 
 from .initializer import Config
 
-from typing import Optional
+# Zoom is multiplied or divided by this on every zoom step.
+ZOOM_STEP = 1.25
 
 
 class ImageGraphicsView(QGraphicsView):
@@ -35,6 +36,9 @@ class ImageGraphicsView(QGraphicsView):
         # Current image pixelmap.
         self._pixmapHandle = None
 
+        # Scale relative to the image fitted in view.
+        self.zoomFactor = 1.0
+
 # Image Displaying
 
     def hasImage(self) -> bool:
@@ -51,6 +55,8 @@ class ImageGraphicsView(QGraphicsView):
             self.scene.removeItem(self._pixmapHandle)
             self._pixmapHandle = None
 
+        self.zoomFactor = 1.0
+
     def updateView(self) -> None:
         """
         Updates image size to fit the scene.
@@ -60,27 +66,42 @@ class ImageGraphicsView(QGraphicsView):
 
         self.fitInView(self.sceneRect(), self.aspectRatioMode)
 
-    def setImage(self, image: QImage) -> None:
+        if self.zoomFactor != 1.0:
+            self.scale(self.zoomFactor, self.zoomFactor)
+
+    def setImage(self, image: QImage, originalSize: QSize = None) -> None:
         """
         Sets scene image.
+
+        originalSize: size of the image file, image decoded at lower resolution is stretched to it.
         """
+        if originalSize is None or not originalSize.isValid():
+            originalSize = image.size()
+
         pixmap = QPixmap.fromImage(image)
-        self.setSceneRect(0, 0, pixmap.width(), pixmap.height())
+        self.setSceneRect(0, 0, originalSize.width(), originalSize.height())
 
         if self.hasImage():
             self._pixmapHandle.setPixmap(pixmap)
         else:
             self._pixmapHandle = self.scene.addPixmap(pixmap)
+            self._pixmapHandle.setTransformationMode(Qt.SmoothTransformation)
+
+        if pixmap.width():
+            self._pixmapHandle.setScale(originalSize.width() / pixmap.width())
 
         self.updateView()
 
-    def getPixmapSize(self) -> Optional[tuple]:
+    def isDownscaled(self) -> bool:
         """
-        Returns current image size.
+        Checks if displayed image has lower resolution than the image file.
         """
-        if self.hasImage():
-            w = self._pixmapHandle.pixmap().size().width()
-            h = self._pixmapHandle.pixmap().size().height()
-            return w, h
+        return self.hasImage() and self._pixmapHandle.pixmap().width() < self.sceneRect().width()
 
-        return None
+    def zoomIn(self) -> None:
+        self.zoomFactor *= ZOOM_STEP
+        self.updateView()
+
+    def zoomOut(self) -> None:
+        self.zoomFactor = max(1.0, self.zoomFactor / ZOOM_STEP)
+        self.updateView()
@@ -1,5 +1,5 @@
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QKeySequence, QImage
+from PyQt5.QtCore import Qt, QSize, pyqtSignal
+from PyQt5.QtGui import QKeySequence, QImage, QImageReader
 from PyQt5.QtWidgets import (QMainWindow,
                              QShortcut,
                              QFileDialog,
@@ -9,6 +9,8 @@ from PyQt5.QtWidgets import (QMainWindow,
 
 from .image_graphics_view import ImageGraphicsView
 from .bottom_bar_layout import BottomBarLayout
+from .image_cache import ImageCache, readImage
+from .thumbnail_grid_view import ThumbnailGridView
 from .initializer import Config
 
 import os
@@ -17,10 +19,16 @@ import os
 class ImageViewerBase(QMainWindow):
     EXIT_CODE_REBOOT = -80084
 
-    def __init__(self, pathsToImages: list = list(), imagePickerToggle: bool = False) -> None:
+    # Can be emitted from any thread while images are being loaded.
+    imageAdded = pyqtSignal(str)
+    loadingFinished = pyqtSignal()
+
+    def __init__(self, pathsToImages: list = list(), imagePickerToggle: bool = False,
+                 loading: bool = False) -> None:
         """
         Simple image viewer made with PyQt.
 
+        loading: more images would be added with 'imageAdded' until 'loadingFinished' is emitted.
         """
         QMainWindow.__init__(self)
 
@@ -33,6 +41,15 @@ class ImageViewerBase(QMainWindow):
         # Bottom bar
         self.bottomBarLayout = BottomBarLayout()
 
+        # Grid of thumbnails, shown instead of the image in grid mode
+        self.thumbnailGridView = ThumbnailGridView(self.imageIsPicked if imagePickerToggle else None)
+        self.thumbnailGridView.hide()
+        self.thumbnailGridView.selectionModel().currentChanged.connect(self.gridCurrentChanged)
+        self.gridMode = False
+
+        # Decoded images, neighbours of current image are decoded in background.
+        self.imageCache = ImageCache(Config.IMAGE_CACHE_SIZE, Config.PREFETCH_THREADS)
+
         # Layout stuff
         self.mainWidget = QWidget(self)
         self.mainLayout = QVBoxLayout(self.mainWidget)
@@ -40,6 +57,7 @@ class ImageViewerBase(QMainWindow):
         self.mainLayout.setSpacing(Config.MAIN_LAYOUT_SPACING)
 
         self.mainLayout.addWidget(self.imageGraphicsView)
+        self.mainLayout.addWidget(self.thumbnailGridView)
         self.mainLayout.addLayout(self.bottomBarLayout)
 
         self.mainWidget.setLayout(self.mainLayout)
@@ -64,8 +82,19 @@ class ImageViewerBase(QMainWindow):
         # All button actions
         self.connectShortcuts()
 
+        # Images that are still being loaded
+        self.loading = loading
+        self.imageAdded.connect(self.addImagePath)
+        self.loadingFinished.connect(self.finishLoading)
+
         # Sets first image
-        self.setImagePaths(pathsToImages)
+        if pathsToImages or not loading:
+            self.setImagePaths(pathsToImages)
+        else:
+            self.pathsToImages = []
+            self.totalImages = 0
+            self.currentImageIndex = 0
+            self.updateCounter()
 
 # Initializes shortcuts
 
@@ -92,6 +121,17 @@ class ImageViewerBase(QMainWindow):
         self.shortcutOpen = QShortcut(QKeySequence(Config.OPEN_FILES_SHORTCUT), self)
         self.shortcutOpen.activated.connect(self.setImagePaths)
 
+        # Zoom shortcuts
+        self.shortcutZoomIn = QShortcut(QKeySequence(Config.ZOOM_IN_SHORTCUT), self)
+        self.shortcutZoomIn.activated.connect(self.zoomIn)
+
+        self.shortcutZoomOut = QShortcut(QKeySequence(Config.ZOOM_OUT_SHORTCUT), self)
+        self.shortcutZoomOut.activated.connect(self.imageGraphicsView.zoomOut)
+
+        # Grid mode shortcut
+        self.shortcutGrid = QShortcut(QKeySequence(Config.GRID_SHORTCUT), self)
+        self.shortcutGrid.activated.connect(self.toggleGrid)
+
         # Maximized screen shortcut
         self.shortcutMaximize = QShortcut(QKeySequence(Config.MAXIMIZE_SHORTCUT), self)
         self.shortcutMaximize.activated.connect(self.toggleMaximize)
@@ -125,6 +165,42 @@ class ImageViewerBase(QMainWindow):
         else:
             self.showMaximized()
 
+    def toggleGrid(self) -> None:
+        """
+        Switches between current image and grid of thumbnails.
+        """
+        self.gridMode = not self.gridMode
+
+        self.imageGraphicsView.setVisible(not self.gridMode)
+        self.thumbnailGridView.setVisible(self.gridMode)
+
+        if self.gridMode:
+            # Full image is not kept while grid is shown.
+            self.imageGraphicsView.clearImage()
+            self.thumbnailGridView.setFocus()
+
+        if self.totalImages:
+            self.showCurrentImage()
+
+    def getDisplaySize(self) -> QSize:
+        """
+        Returns size of the screen in device pixels, images are decoded at most at this size.
+        """
+        window = self.windowHandle()
+        screen = window.screen() if window else qApp.primaryScreen()
+
+        return screen.size() * screen.devicePixelRatio()
+
+    def zoomIn(self) -> None:
+        """
+        Zooms current image in, image is decoded at full resolution first.
+        """
+        if self.imageGraphicsView.isDownscaled():
+            filePath = self.getCurrentImagePath()
+            self.imageGraphicsView.setImage(readImage(filePath), QImageReader(filePath).size())
+
+        self.imageGraphicsView.zoomIn()
+
 # Image loading and setting
 
     def getCurrentImagePath(self) -> str:
@@ -135,12 +211,34 @@ class ImageViewerBase(QMainWindow):
 
     def loadImageFromFile(self, filePath: str = None) -> QImage:
         """
-        Loads located at filePath.
+        Loads located at filePath at most at display resolution, cached image is used if present.
         """
+        image = self.imageCache.get(filePath)
+        if image is not None:
+            return image
+
         if not os.path.isfile(filePath):
             raise FileNotFoundError
 
-        return QImage(filePath)
+        image = readImage(filePath, self.getDisplaySize())
+        self.imageCache.put(filePath, image)
+
+        return image
+
+    def prefetchImages(self) -> None:
+        """
+        Decodes next and previous PREFETCH_COUNT images in background.
+        """
+        filePaths = []
+
+        for offset in range(1, Config.PREFETCH_COUNT + 1):
+            for index in (self.currentImageIndex + offset, self.currentImageIndex - offset):
+                filePath = self.pathsToImages[index % self.totalImages]
+
+                if filePath not in filePaths:
+                    filePaths.append(filePath)
+
+        self.imageCache.prefetch(filePaths, self.getDisplaySize())
 
     def setLoadedImage(self) -> None:
         """
@@ -154,9 +252,37 @@ class ImageViewerBase(QMainWindow):
             self.updatePickerBar()
 
         image = self.loadImageFromFile(filePath)
-        self.imageGraphicsView.setImage(image)
+        # Size is read from the header of the image file.
+        self.imageGraphicsView.setImage(image, QImageReader(filePath).size())
         self.updateBottomBar(filePath)
 
+        self.prefetchImages()
+
+    def showCurrentImage(self) -> None:
+        """
+        Displays current image, in grid mode selects its thumbnail.
+        """
+        if not self.gridMode:
+            self.setLoadedImage()
+            return
+
+        self.thumbnailGridView.setCurrentRow(self.currentImageIndex)
+
+        if self.usingPicker():
+            self.updatePickerBar()
+
+        self.updateBottomBar(self.getCurrentImagePath())
+
+    def gridCurrentChanged(self, current, previous) -> None:
+        """
+        Makes image selected in the grid current.
+        """
+        if not current.isValid() or current.row() == self.currentImageIndex:
+            return
+
+        self.currentImageIndex = current.row()
+        self.showCurrentImage()
+
     def setImagePaths(self, filePaths: list = None) -> None:
         """
         Sets paths to images. Then displays first image.
@@ -164,11 +290,35 @@ class ImageViewerBase(QMainWindow):
         if not filePaths:
             filePaths, _ = QFileDialog.getOpenFileNames(self, "Open image files.")
 
-        self.pathsToImages = filePaths
+        self.pathsToImages = list(filePaths)
         self.totalImages = len(filePaths)
         self.currentImageIndex = 0
 
-        self.setLoadedImage()
+        self.imageCache.clear()
+        self.thumbnailGridView.thumbnailModel.setImagePaths(self.pathsToImages)
+
+        self.showCurrentImage()
+
+    def addImagePath(self, filePath: str) -> None:
+        """
+        Adds image to the end, displays it if there were no images.
+        """
+        self.pathsToImages.append(filePath)
+        self.totalImages += 1
+
+        self.thumbnailGridView.thumbnailModel.addImagePath(filePath)
+
+        if self.totalImages == 1:
+            self.showCurrentImage()
+        else:
+            self.updateCounter()
+
+    def finishLoading(self) -> None:
+        """
+        Marks that no more images would be added.
+        """
+        self.loading = False
+        self.updateCounter()
 
 # Changing Image
 
@@ -178,7 +328,7 @@ class ImageViewerBase(QMainWindow):
         """
         if self.totalImages > 1:
             self.currentImageIndex = (self.currentImageIndex + 1) % self.totalImages
-            self.setLoadedImage()
+            self.showCurrentImage()
 
     def previousImage(self) -> None:
         """
@@ -186,7 +336,7 @@ class ImageViewerBase(QMainWindow):
         """
         if self.totalImages > 1:
             self.currentImageIndex = (self.currentImageIndex - 1) % self.totalImages
-            self.setLoadedImage()
+            self.showCurrentImage()
 
     def updateBottomBar(self, imagePath: str) -> None:
         """
@@ -195,11 +345,23 @@ class ImageViewerBase(QMainWindow):
         fileName = os.path.basename(imagePath)
         self.bottomBarLayout.changeNametext(fileName)
 
-        w, h = self.imageGraphicsView.getPixmapSize()
-        imageSize = f"{w}x{h}"
+        # Size is read from the header, image may be not decoded in grid mode.
+        size = QImageReader(imagePath).size()
+        imageSize = f"{size.width()}x{size.height()}"
         self.bottomBarLayout.changeResolutionText(imageSize)
 
-        text = f"{self.currentImageIndex + 1}/{self.totalImages}"
+        self.updateCounter()
+
+    def updateCounter(self) -> None:
+        """
+        Updates counter, '+' is shown while images are being loaded.
+        """
+        current = self.currentImageIndex + 1 if self.totalImages else 0
+
+        text = f"{current}/{self.totalImages}"
+        if self.loading:
+            text += "+"
+
         self.bottomBarLayout.changeCounterText(text)
 
 # Image Picking
@@ -229,6 +391,9 @@ class ImageViewerBase(QMainWindow):
         """
         Updates current image in picked images and picker bar.
         """
+        if not self.totalImages:
+            return
+
         currentImagePath = self.getCurrentImagePath()
 
         if self.imageIsPicked(currentImagePath):
@@ -237,13 +402,18 @@ class ImageViewerBase(QMainWindow):
             self.pickedImages.add(currentImagePath)
 
         self.updatePickerBar()
+        self.thumbnailGridView.thumbnailModel.updateImage(currentImagePath)
 
     def tickAll(self) -> None:
         """
         Ticks all images, updates bar.
         """
-        self.pickedImages = self.pathsToImages.copy()
+        if not self.totalImages:
+            return
+
+        self.pickedImages = set(self.pathsToImages)
         self.updatePickerBar()
+        self.thumbnailGridView.thumbnailModel.updateAll()
 
 # Events
 
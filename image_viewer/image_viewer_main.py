@@ -5,6 +5,8 @@ from PyQt5.QtWidgets import QApplication
 import sys
 import os
 
+from threading import Lock
+
 from typing import Optional
 
 
@@ -18,26 +20,55 @@ def suppress_qt_warnings():
 class ImageViewer:
 
     def __init__(self, pathsToImages: list = list(),
-                 imagePickerToggle: bool = False) -> None:
+                 imagePickerToggle: bool = False, loading: bool = False) -> None:
         """
         Wrapper for ImageViwerBase.
+
+        loading: images are added with 'addImagePath' until 'finishLoading' is called.
         """
         suppress_qt_warnings()
 
         self.imagePickerToggle = imagePickerToggle
-        self.pathsToImages = pathsToImages
+        self.pathsToImages = list(pathsToImages)
+        self.loading = loading
+
+        self.imageViewerBase = None
+        # Viewer is not replaced while image is being added.
+        self._lock = Lock()
 
         self.app = QApplication(sys.argv)
 
+    def addImagePath(self, path: str) -> None:
+        """
+        Adds image to the viewer, can be called from any thread.
+        """
+        with self._lock:
+            self.pathsToImages.append(path)
+
+            if self.imageViewerBase:
+                self.imageViewerBase.imageAdded.emit(path)
+
+    def finishLoading(self) -> None:
+        """
+        Marks that no more images would be added, can be called from any thread.
+        """
+        with self._lock:
+            self.loading = False
+
+            if self.imageViewerBase:
+                self.imageViewerBase.loadingFinished.emit()
+
     def run(self) -> Optional[list]:
         """
         Runs image viwer.
         """
         while True:
 
-            self.imageViewerBase = ImageViewerBase(
-                pathsToImages=self.pathsToImages,
-                imagePickerToggle=self.imagePickerToggle)
+            with self._lock:
+                self.imageViewerBase = ImageViewerBase(
+                    pathsToImages=self.pathsToImages,
+                    imagePickerToggle=self.imagePickerToggle,
+                    loading=self.loading)
             self.imageViewerBase.show()
 
             if self.app.exec() != ImageViewerBase.EXIT_CODE_REBOOT:
@@ -6,6 +6,8 @@ SETTINGS_FILE = "settings.json"
 MAIN_WINDOW_SETTINGS = "main_window"
 BOTTOM_BAR_SETTINGS = "bottom_bar"
 SHORTCUTS_SETTINGS = "shortcuts"
+IMAGE_CACHE_SETTINGS = "image_cache"
+THUMBNAILS_SETTINGS = "thumbnails"
 FONTS_FOLDER = "fonts"
 
 
@@ -43,6 +45,8 @@ class Config:
         main_window_settings = user_settings[MAIN_WINDOW_SETTINGS]
         bottom_bar_settings = user_settings[BOTTOM_BAR_SETTINGS]
         shortcuts = user_settings[SHORTCUTS_SETTINGS]
+        image_cache_settings = user_settings[IMAGE_CACHE_SETTINGS]
+        thumbnails_settings = user_settings[THUMBNAILS_SETTINGS]
 
         # Constants
         cls.MAIN_LAYOUT_MARGINS = main_window_settings["main_layout_margins"]
@@ -53,6 +57,16 @@ class Config:
         cls.BOTTOM_BAR_HEIGHT = bottom_bar_settings["bottom_bar_height"]
         cls.PICKER_SYMBOL = bottom_bar_settings["picker_symbol"]
 
+        cls.IMAGE_CACHE_SIZE = image_cache_settings["cache_size_mb"] * 1024 * 1024
+        cls.PREFETCH_COUNT = image_cache_settings["prefetch_count"]
+        cls.PREFETCH_THREADS = image_cache_settings["prefetch_threads"]
+
+        cls.THUMBNAIL_SIZE = thumbnails_settings["thumbnail_size"]
+        cls.THUMBNAIL_SPACING = thumbnails_settings["thumbnail_spacing"]
+        cls.THUMBNAIL_THREADS = thumbnails_settings["thumbnail_threads"]
+        cls.THUMBNAIL_CACHE_SIZE = thumbnails_settings["memory_cache_size_mb"] * 1024 * 1024
+        cls.THUMBNAIL_CACHE_PATH = os.path.expanduser(thumbnails_settings["cache_path"])
+
         # Style sheets
         cls.MAIN_WINDOW_STYLE_SHEET = (
             "background-color: {background};"
@@ -163,6 +177,9 @@ class Config:
         cls.NEXT_IMAGE_SHORTCUT = shortcuts["next_image_shortcut"]
         cls.OPEN_FILES_SHORTCUT = shortcuts["open_files_shortcut"]
         cls.MAXIMIZE_SHORTCUT = shortcuts["maximize_shortcut"]
+        cls.ZOOM_IN_SHORTCUT = shortcuts["zoom_in_shortcut"]
+        cls.ZOOM_OUT_SHORTCUT = shortcuts["zoom_out_shortcut"]
+        cls.GRID_SHORTCUT = shortcuts["grid_shortcut"]
         cls.RELOAD_SHORTCUT = shortcuts["reload_shortcut"]
         cls.PICK_SHORTCUT = shortcuts["pick_shortcut"]
         cls.PICK_ALL_SHORTCUT = shortcuts["pick_all_shortcut"]
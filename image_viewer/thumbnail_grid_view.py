@@ -0,0 +1,188 @@
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QSize
+from PyQt5.QtGui import QImage, QImageReader, QPixmap
+from PyQt5.QtWidgets import QListView
+
+from .image_cache import ImageCache, ImageLoaderTask, readImage
+from .initializer import Config
+
+import hashlib
+import os
+import pathlib
+
+from typing import Any, Callable
+
+
+def getThumbnailPath(fileUri: str, size: int) -> str:
+    """
+    Returns path of cached thumbnail, it is named as in freedesktop thumbnail spec.
+    """
+    sizeFolder = "normal" if size <= 128 else "large" if size <= 256 else f"{size}"
+
+    return os.path.join(Config.THUMBNAIL_CACHE_PATH, sizeFolder,
+                        hashlib.md5(fileUri.encode()).hexdigest() + ".png")
+
+
+class ThumbnailLoaderTask(ImageLoaderTask):
+    """
+    Loads thumbnail from the disk cache, makes and caches it if there is no thumbnail yet.
+
+    Thumbnails are keyed by file uri and keep mtime and size of the file,
+    so a cached thumbnail costs a stat and the image is read only when it changed.
+    """
+    def run(self) -> None:
+        try:
+            stat = os.stat(self.filePath)
+        except OSError:
+            self.signals.loaded.emit(self.filePath, QImage())
+            return
+
+        fileUri = pathlib.Path(os.path.abspath(self.filePath)).as_uri()
+        thumbnailPath = getThumbnailPath(fileUri, self.maxSize.width())
+
+        image = QImage(thumbnailPath)
+
+        # Thumbnail of a file that was replaced since is made again.
+        if (image.isNull() or image.text("Thumb::MTime") != str(int(stat.st_mtime))
+                or image.text("Thumb::Size") != str(stat.st_size)):
+            image = readImage(self.filePath, self.maxSize)
+
+            if not image.isNull():
+                self.saveThumbnail(image, thumbnailPath, fileUri, stat)
+
+        self.signals.loaded.emit(self.filePath, image)
+
+    def saveThumbnail(self, image: QImage, thumbnailPath: str, fileUri: str,
+                      stat: os.stat_result) -> None:
+        os.makedirs(os.path.dirname(thumbnailPath), exist_ok=True)
+
+        size = QImageReader(self.filePath).size()
+
+        image.setText("Thumb::URI", fileUri)
+        image.setText("Thumb::MTime", str(int(stat.st_mtime)))
+        image.setText("Thumb::Size", str(stat.st_size))
+        image.setText("Thumb::Image::Width", str(size.width()))
+        image.setText("Thumb::Image::Height", str(size.height()))
+        image.setText("Software", "Wallpaper finder")
+
+        # Other viewers never see half-written thumbnail.
+        tempPath = f"{thumbnailPath}.{os.getpid()}.{id(self)}.tmp"
+        if image.save(tempPath, "PNG"):
+            os.replace(tempPath, thumbnailPath)
+
+
+class ThumbnailModel(QAbstractListModel):
+    def __init__(self, isPicked: Callable[[str], bool] = None) -> None:
+        """
+        Model of images shown in the grid.
+
+        Thumbnails are loaded only when view asks for them, so only visible cells are decoded.
+
+        isPicked: checks if image is picked, None if picker is disabled.
+        """
+        QAbstractListModel.__init__(self)
+
+        self.isPicked = isPicked
+        self.thumbnailSize = QSize(Config.THUMBNAIL_SIZE, Config.THUMBNAIL_SIZE)
+
+        self.filePaths = []
+        # Path -> row, to update cell when its thumbnail is loaded.
+        self.rows = {}
+
+        self.thumbnailCache = ImageCache(Config.THUMBNAIL_CACHE_SIZE, Config.THUMBNAIL_THREADS,
+                                         ThumbnailLoaderTask)
+        self.thumbnailCache.imageCached.connect(self.updateImage)
+
+    def setImagePaths(self, filePaths: list) -> None:
+        self.beginResetModel()
+
+        self.filePaths = list(filePaths)
+        self.rows = {filePath: row for row, filePath in enumerate(self.filePaths)}
+
+        self.endResetModel()
+
+    def addImagePath(self, filePath: str) -> None:
+        row = len(self.filePaths)
+
+        self.beginInsertRows(QModelIndex(), row, row)
+
+        self.filePaths.append(filePath)
+        self.rows[filePath] = row
+
+        self.endInsertRows()
+
+    def updateImage(self, filePath: str) -> None:
+        """
+        Redraws cell of image at filePath.
+        """
+        row = self.rows.get(filePath)
+
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    def updateAll(self) -> None:
+        """
+        Redraws all cells, e.g. after all images were picked.
+        """
+        if self.filePaths:
+            self.dataChanged.emit(self.index(0), self.index(len(self.filePaths) - 1))
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.filePaths)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+
+        filePath = self.filePaths[index.row()]
+
+        if role == Qt.DecorationRole:
+            image = self.thumbnailCache.get(filePath)
+
+            if image is None:
+                self.thumbnailCache.prefetch([filePath], self.thumbnailSize)
+                return None
+
+            return QPixmap.fromImage(image)
+
+        if role == Qt.CheckStateRole and self.isPicked:
+            return Qt.Checked if self.isPicked(filePath) else Qt.Unchecked
+
+        if role == Qt.ToolTipRole:
+            return os.path.basename(filePath)
+
+        return None
+
+
+class ThumbnailGridView(QListView):
+    """
+    Grid of thumbnails, only visible cells are drawn.
+    """
+
+    def __init__(self, isPicked: Callable[[str], bool] = None) -> None:
+        QListView.__init__(self)
+
+        self.setStyleSheet(Config.IMAGE_GRAPHICS_STYLE_SHEET)
+
+        self.thumbnailModel = ThumbnailModel(isPicked)
+        self.setModel(self.thumbnailModel)
+
+        # Grid with cells of the same size.
+        self.setViewMode(QListView.IconMode)
+        self.setResizeMode(QListView.Adjust)
+        self.setMovement(QListView.Static)
+        self.setUniformItemSizes(True)
+        self.setIconSize(self.thumbnailModel.thumbnailSize)
+        self.setGridSize(self.thumbnailModel.thumbnailSize + QSize(Config.THUMBNAIL_SPACING,
+                                                                   Config.THUMBNAIL_SPACING))
+
+        # Cells are laid out in batches, so big grids don't freeze the window.
+        self.setLayoutMode(QListView.Batched)
+
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+
+    def setCurrentRow(self, row: int) -> None:
+        index = self.thumbnailModel.index(row)
+
+        self.setCurrentIndex(index)
+        self.scrollTo(index)
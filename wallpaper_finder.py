@@ -1,8 +1,12 @@
 import argparse
 import json
 
-from wallpaper_finder import RedditPicturesLoader, RedditPicturesLoaderApi, FileUtils
-from image_viewer import ImageViewer
+from threading import Thread
+
+from wallpaper_finder import (RedditPicturesLoader, RedditPicturesLoaderApi, FileUtils,
+                              HttpSession, RateLimiter, ListingCache, UrlLedger, TokenManager,
+                              ImageFilter, DownloadJournal, ImagePicker, Metrics,
+                              FailureCollector, RetryPolicy)
 
 SETTINGS_PATH = "./settings.json"
 
@@ -59,6 +63,17 @@ def arguments() -> dict:
         help="If present script would not save duplicates of images in save-folder."
     )
 
+    parser.add_argument(
+        "-dt",
+        "--duplicate-threshold",
+        metavar="THRESHOLD",
+        type=int,
+        dest="duplicate_threshold",
+        default=None,
+        nargs='?',
+        help="Images which hashes differ by at most this number of bits are duplicates."
+    )
+
     parser.add_argument(
         "-nt",
         "--number-of-threads",
@@ -69,6 +84,45 @@ def arguments() -> dict:
         help="Number of threads to use for loading images."
     )
 
+    parser.add_argument(
+        "-de",
+        "--download-engine",
+        metavar="ENGINE",
+        type=str,
+        dest="download_engine",
+        default=None,
+        nargs='?',
+        help="Engine for loading images. Can be threads or asyncio."
+    )
+
+    parser.add_argument(
+        "-np",
+        "--number-of-processes",
+        type=int,
+        dest="number_of_processes",
+        default=None,
+        nargs='?',
+        help="Number of processes to use for hashing images. Uses all cores by default."
+    )
+
+    parser.add_argument(
+        "-sv",
+        "--stream-viewer",
+        action="store_true",
+        default=None,
+        dest="stream_viewer",
+        help="If present image viewer would open with the first loaded image."
+    )
+
+    parser.add_argument(
+        "-hl",
+        "--headless",
+        action="store_true",
+        default=None,
+        dest="headless",
+        help="If present images would be picked by 'pick_rules' without image viewer."
+    )
+
     parser.add_argument(
         "-ua",
         "--use-api",
@@ -87,6 +141,15 @@ def arguments() -> dict:
         help="Images with only this extensions are allowed."
     )
 
+    parser.add_argument(
+        "-pt",
+        "--pass-through",
+        action="store_true",
+        default=None,
+        dest="pass_through",
+        help="If present images would be saved as downloaded, without re-encoding."
+    )
+
     parser.add_argument(
         "--credentials",
         metavar="PATH",
@@ -132,16 +195,80 @@ def arguments() -> dict:
     return vars(args)
 
 
-def main(r_parser: RedditPicturesLoader, remove_duplicates: bool, verbose: bool) -> None:
+def pick_while_loading(r_parser: RedditPicturesLoader, image_paths: list, verbose: bool) -> tuple:
+    """
+    Opens image viewer right away and adds images to it as soon as they are loaded.
+
+    Returns picked images and images shown in the viewer.
+    """
+    from image_viewer import ImageViewer
+
+    imageViewer = ImageViewer([], True, loading=True)
+    failures = []
+
+    def load() -> None:
+        try:
+            image_paths.extend(r_parser.load_pictures(r_parser.subreddits, verbose,
+                                                      lambda info: imageViewer.addImagePath(info.path)))
+        except BaseException as e:
+            failures.append(e)
+        finally:
+            imageViewer.finishLoading()
+
+    loader = Thread(target=load, daemon=True)
+    loader.start()
+
+    images_to_save = imageViewer.run()
+    images_shown = list(imageViewer.pathsToImages)
+
+    if loader.is_alive():
+        print("Waiting for images to load...")
+    loader.join()
+
+    if failures:
+        raise failures[0]
+
+    return images_to_save, images_shown
+
+
+def pick_by_rules(r_parser: RedditPicturesLoader, image_paths: list) -> list:
+    """
+    Returns images that pass ImagePicker rules.
+    """
+    return [image_path for image_path in image_paths
+            if ImagePicker.is_picked(r_parser.image_info[image_path],
+                                     r_parser.get_image_post_info(image_path))]
+
+
+def main(r_parser: RedditPicturesLoader, remove_duplicates: bool, verbose: bool,
+         stream_viewer: bool = False, headless: bool = False) -> None:
     image_paths = []
     try:
-        image_paths = r_parser.load_pictures(r_parser.subreddits, verbose)
+        if headless:
+            image_paths = r_parser.load_pictures(r_parser.subreddits, verbose)
+
+            images_to_save = pick_by_rules(r_parser, image_paths)
+            images_shown = image_paths
 
-        imageViewer = ImageViewer(image_paths, True)
+            remove_duplicates = remove_duplicates or ImagePicker.not_duplicate
 
-        images_to_save = imageViewer.run()
+            print(f"Picked {len(images_to_save)} of {len(image_paths)} images.")
+        elif stream_viewer:
+            images_to_save, images_shown = pick_while_loading(r_parser, image_paths, verbose)
+        else:
+            # PyQt is imported only when viewer is used.
+            from image_viewer import ImageViewer
+
+            image_paths = r_parser.load_pictures(r_parser.subreddits, verbose)
+
+            imageViewer = ImageViewer(image_paths, True)
+
+            images_to_save = imageViewer.run()
+            images_shown = image_paths
 
         images_to_remove = [im for im in image_paths if im not in images_to_save]
+        # Images loaded after viewer was closed were not rejected by user.
+        r_parser.record_outcome([im for im in images_shown if im not in images_to_save], "rejected")
 
         if remove_duplicates and images_to_save:
             images_to_save, images_to_remove_ = FileUtils.find_duplicates(images_to_save,
@@ -150,15 +277,30 @@ def main(r_parser: RedditPicturesLoader, remove_duplicates: bool, verbose: bool)
                                                                           verbose)
 
             images_to_remove += images_to_remove_
+            r_parser.record_outcome(images_to_remove_, "duplicate")
+
+        files_existed = FileUtils.move_images(images_to_save,
+                                              FileUtils.save_folder_path,
+                                              verbose)
+        images_to_remove += files_existed
 
-        images_to_remove += FileUtils.move_images(images_to_save,
-                                                  FileUtils.save_folder_path,
-                                                  verbose)
+        r_parser.record_outcome(files_existed, "duplicate")
+        r_parser.record_outcome([im for im in images_to_save if im not in files_existed], "saved")
 
         FileUtils.remove_files(images_to_remove)
+
+        # Images loaded by an interrupted run that were not listed again.
+        FileUtils.remove_files(DownloadJournal.get_unused_paths())
+        DownloadJournal.clear()
     except (BaseException, KeyboardInterrupt) as e:
-        FileUtils.remove_files(image_paths)
+        # Loaded images are reused by the next run.
+        if not DownloadJournal.is_enabled():
+            FileUtils.remove_files(image_paths)
         raise e
+    finally:
+        UrlLedger.save()
+        Metrics.write()
+        r_parser.errors.write_report()
 
 
 if __name__ == "__main__":
@@ -176,7 +318,33 @@ if __name__ == "__main__":
     FileUtils.set_save_folder_path(settings["save_folder_path"])
     FileUtils.set_temp_folder_path(settings["temp_folder_path"])
     FileUtils.set_extensions(settings["allowed_extensions"])
+    FileUtils.set_pass_through(settings["pass_through"])
+    FileUtils.set_save_layout(settings["save_layout"])
     FileUtils.set_number_of_threads(settings["number_of_threads"])
+    FileUtils.set_download_engine(settings["download_engine"])
+    FileUtils.set_connection_limits(settings["max_connections"], settings["max_connections_per_host"])
+    FileUtils.set_number_of_processes(settings["number_of_processes"])
+    FileUtils.set_duplicate_threshold(settings["duplicate_threshold"])
+
+    # Every thread and every listed subreddit can hold a connection.
+    pool_size = settings["http_pool_size"] or max(settings["number_of_threads"],
+                                                  len(settings["subreddits"]))
+    HttpSession.configure(pool_size, settings["http_timeout"], settings["http_keep_alive"],
+                          settings["http_pool_hosts"])
+    RateLimiter.configure(settings["requests_per_minute"])
+    RetryPolicy.configure(settings["max_retries"], settings["retry_backoff"])
+    ImageFilter.configure(settings["image_filter"])
+    ImagePicker.configure(settings["pick_rules"])
+
+    ListingCache.set_cache_folder_path(settings["listing_cache_path"])
+    ListingCache.set_ttls(settings["listing_cache_ttl"])
+
+    UrlLedger.open(settings["ledger_path"], settings["ledger_skip_outcomes"])
+
+    Metrics.set_output_paths(settings["metrics_path"], settings["prometheus_path"])
+    FailureCollector.set_report_path(settings["failure_report_path"])
+
+    DownloadJournal.open(settings["temp_folder_path"] if settings["resume_downloads"] else None)
 
     reddit_parser = None
     if settings["use_api"]:
@@ -184,6 +352,8 @@ if __name__ == "__main__":
         with open(settings["credentials_path"]) as f:
             credentials = json.load(f)
 
+        TokenManager.set_cache_path(settings["token_cache_path"])
+
         reddit_parser = RedditPicturesLoaderApi(
             credentials=credentials,
             subreddits=settings["subreddits"],
@@ -198,6 +368,7 @@ if __name__ == "__main__":
             limit=settings["limit"],
             time_filter=settings["time_filter"])
 
-    main(reddit_parser, settings["remove_duplicates"], settings["verbose"])
+    main(reddit_parser, settings["remove_duplicates"], settings["verbose"],
+         settings["stream_viewer"], settings["headless"])
 
     print("Done...")
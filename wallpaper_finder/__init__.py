@@ -1,3 +1,15 @@
 from .reddit_pictures import RedditPicturesLoader
 from .reddit_pictures_api import RedditPicturesLoaderApi
-from .utils import FileUtils
\ No newline at end of file
+from .utils import FileUtils, ImageInfo
+from .http_session import HttpSession
+from .listing_cache import ListingCache
+from .url_ledger import UrlLedger
+from .rate_limiter import RateLimiter
+from .token_manager import TokenManager
+from .image_filter import ImageFilter
+from .download_journal import DownloadJournal
+from .image_picker import ImagePicker
+from .content_store import ContentStore
+from .library_scanner import LibraryScanner
+from .metrics import Metrics
+from .failures import FailureCollector, RetryPolicy
@@ -0,0 +1,200 @@
+import asyncio
+import os
+
+import aiohttp
+
+from os.path import basename
+
+from PIL.Image import DecompressionBombWarning
+
+from typing import Callable, Iterator
+
+from .utils import FileUtils, ImageFileWriter, ImageHeaderChecker, ImageInfo, CHUNK_SIZE
+from .http_session import HttpSession
+from .image_filter import ImageFilter
+from .download_journal import DownloadJournal, LOADING, COMPLETE
+from .metrics import Metrics
+from .failures import HttpStatusError, RetryPolicy, LOADING_ERRORS
+
+# Listed urls waiting to be loaded, listing pauses when queue is full.
+URL_QUEUE_SIZE = 256
+
+
+class AsyncImageLoader:
+    def __init__(self, on_loaded: Callable[[str, ImageInfo], None],
+                 on_error: Callable[[str, BaseException, int], None]) -> None:
+        """
+        Loads images to the temp folder in a single event loop.
+
+        on_loaded: called with url and info of every loaded image.
+        on_error: called with url, error and number of attempts of every image that failed to load.
+        """
+        self.on_loaded = on_loaded
+        self.on_error = on_error
+
+    def run(self, pages: list) -> None:
+        """
+        Loads all images from 'pages'.
+
+        pages: iterators that yield lists of image urls, they are listed concurrently.
+        """
+        asyncio.run(self.load_all(pages))
+
+    async def load_all(self, pages: list) -> None:
+        """
+        Loads images with at most 'FileUtils.max_connections' connections
+        while urls are still being listed.
+        """
+        connector = aiohttp.TCPConnector(limit=FileUtils.max_connections,
+                                         limit_per_host=FileUtils.max_connections_per_host,
+                                         force_close=not HttpSession.keep_alive)
+
+        connect_timeout, read_timeout = HttpSession.timeout
+        timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+
+        image_urls = asyncio.Queue(maxsize=URL_QUEUE_SIZE)
+        self.failures = []
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            loaders = [asyncio.create_task(self.load_images(session, image_urls))
+                       for _ in range(FileUtils.max_connections)]
+
+            try:
+                await asyncio.gather(*(self.list_urls(page_iterator, image_urls)
+                                       for page_iterator in pages))
+                await image_urls.join()
+            finally:
+                for loader in loaders:
+                    loader.cancel()
+
+                await asyncio.gather(*loaders, return_exceptions=True)
+
+        if self.failures:
+            raise self.failures[0]
+
+    async def list_urls(self, page_iterator: Iterator[list], image_urls: asyncio.Queue) -> None:
+        """
+        Puts urls from 'page_iterator' to 'image_urls', pages are loaded in the default executor.
+        """
+        loop = asyncio.get_running_loop()
+
+        while True:
+            page = await loop.run_in_executor(None, next, page_iterator, None)
+            if page is None:
+                return
+
+            for image_url in page:
+                await image_urls.put(image_url)
+
+    async def load_images(self, session: aiohttp.ClientSession, image_urls: asyncio.Queue) -> None:
+        while True:
+            image_url = await image_urls.get()
+
+            try:
+                await self.load(session, image_url)
+            except Exception as e:
+                self.failures.append(e)
+            finally:
+                image_urls.task_done()
+
+    async def load(self, session: aiohttp.ClientSession, image_url: str) -> None:
+        """
+        Loads image at 'image_url' with retries.
+
+        Files, journal and callbacks are used in the default executor, so the loop is not
+        blocked by disk writes, e.g. by flush of every journal line.
+        """
+        loop = asyncio.get_running_loop()
+
+        # Image was loaded by an interrupted run.
+        image_info = DownloadJournal.get_completed(image_url)
+        if image_info:
+            Metrics.increment("journal_hits")
+            await loop.run_in_executor(None, self.on_loaded, image_url, image_info)
+            return
+
+        file_path = await loop.run_in_executor(None, FileUtils.get_temp_file_path, basename(image_url))
+        await loop.run_in_executor(None, DownloadJournal.mark, image_url, LOADING, None, file_path)
+
+        # Transient failures are retried by RetryPolicy.
+        retries = {}
+        while True:
+            try:
+                with Metrics.timer("download_seconds"):
+                    image_info = await self.save_image_from_url(session, image_url, file_path)
+            except LOADING_ERRORS as e:
+                delay = RetryPolicy.get_delay(e, retries)
+                if delay is not None:
+                    await asyncio.sleep(delay)
+                    continue
+
+                await loop.run_in_executor(None, self.remove, image_url, file_path)
+                await loop.run_in_executor(None, self.on_error, image_url, e, sum(retries.values()) + 1)
+            else:
+                await loop.run_in_executor(None, DownloadJournal.mark, image_url, COMPLETE, image_info)
+                await loop.run_in_executor(None, self.on_loaded, image_url, image_info)
+
+            return
+
+    def remove(self, image_url: str, file_path: str) -> None:
+        """
+        Removes file and journal entry of download that failed.
+        """
+        FileUtils.remove_files([file_path])
+        DownloadJournal.remove(image_url)
+
+    async def save_image_from_url(self, session: aiohttp.ClientSession,
+                                  url: str, file_path: str) -> ImageInfo:
+        """
+        Async version of 'FileUtils.save_image_from_url'.
+
+        Loading stops as soon as size or header of the image is not allowed.
+        Header checks, decoding, encoding, writing and verifying are done in the default executor.
+        """
+        if os.path.splitext(file_path)[1] not in FileUtils.allowed_extensions:
+            raise ValueError("Invalid extension to save")
+
+        loop = asyncio.get_running_loop()
+
+        async with session.get(url) as response:
+            if response.status >= 400:
+                raise HttpStatusError(response.status, response.headers.get("Retry-After"))
+
+            try:
+                ImageFilter.check_bytes(response.headers.get("Content-Length"))
+
+                checker = ImageHeaderChecker()
+
+                if not FileUtils.pass_through:
+                    content = bytearray()
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        Metrics.increment("downloaded_bytes", len(chunk))
+                        if not checker.checked:
+                            await loop.run_in_executor(None, checker.feed, chunk)
+                        content += chunk
+
+                    FileUtils.check_length(len(content), response.headers)
+
+                    return await loop.run_in_executor(None, FileUtils.save_image_content,
+                                                      bytes(content), file_path)
+
+                writer = await loop.run_in_executor(None, ImageFileWriter, file_path)
+                try:
+                    received = 0
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        Metrics.increment("downloaded_bytes", len(chunk))
+                        if not checker.checked:
+                            await loop.run_in_executor(None, checker.feed, chunk)
+                        await loop.run_in_executor(None, writer.write, chunk)
+                        received += len(chunk)
+
+                    FileUtils.check_length(received, response.headers)
+
+                    return await loop.run_in_executor(None, writer.finish)
+                except BaseException as e:
+                    writer.abort()
+                    raise e
+            except (ValueError, DecompressionBombWarning) as e:
+                # Rest of the image is not downloaded.
+                response.close()
+                raise e
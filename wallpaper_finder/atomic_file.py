@@ -0,0 +1,27 @@
+import os
+
+from uuid import uuid4
+
+
+def write_atomic(path: str, text: str, mode: int = 0o666) -> None:
+    """
+    Writes 'text' to 'path', file is replaced only after it is fully written.
+
+    Readers and interrupted runs never see half of the file. Every call writes
+    its own temp file, so concurrent writers don't mix their content.
+
+    mode: permissions of a new file, e.g. 0o600 for secrets.
+    """
+    temp_path = f"{path}.{uuid4().hex}.tmp"
+
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+
+        os.replace(temp_path, path)
+    except BaseException as e:
+        if os.path.isfile(temp_path):
+            os.unlink(temp_path)
+
+        raise e
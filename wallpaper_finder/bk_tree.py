@@ -0,0 +1,82 @@
+from typing import Any, Optional, Tuple
+
+
+def hamming_distance(hash1: int, hash2: int) -> int:
+    """
+    Number of different bits in 'hash1' and 'hash2'.
+    """
+    return bin(hash1 ^ hash2).count("1")
+
+
+class BKTree:
+    def __init__(self) -> None:
+        """
+        BK-tree of hex image hashes, used to find similar hashes by Hamming distance.
+
+        Node is a list [hash, value, children], where children is a dict of distance: node.
+        """
+        self.root = None
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, image_hash: str, value: Any) -> None:
+        """
+        Adds 'image_hash' with 'value'. Value of an already added hash is not changed.
+        """
+        hash_value = int(image_hash, 16)
+
+        if self.root is None:
+            self.root = [hash_value, value, {}]
+            self.size += 1
+            return
+
+        node = self.root
+        while True:
+            distance = hamming_distance(hash_value, node[0])
+
+            if distance == 0:
+                return
+
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [hash_value, value, {}]
+                self.size += 1
+                return
+
+            node = child
+
+    def find(self, image_hash: str, max_distance: int) -> Optional[Tuple[Any, int]]:
+        """
+        Returns (value, distance) of the closest hash within 'max_distance' or None.
+        """
+        if self.root is None:
+            return None
+
+        hash_value = int(image_hash, 16)
+
+        best = None
+        best_distance = max_distance + 1
+
+        stack = [self.root]
+        while stack:
+            node_hash, value, children = stack.pop()
+            distance = hamming_distance(hash_value, node_hash)
+
+            if distance < best_distance:
+                best, best_distance = value, distance
+
+                if distance == 0:
+                    break
+
+            # By triangle inequality only these subtrees can have closer hashes.
+            low, high = distance - best_distance, distance + best_distance
+            for child_distance, child in children.items():
+                if low < child_distance < high:
+                    stack.append(child)
+
+        if best_distance > max_distance:
+            return None
+
+        return best, best_distance
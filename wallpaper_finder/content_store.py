@@ -0,0 +1,91 @@
+import hashlib
+import os
+import sqlite3
+
+from typing import Optional
+
+from .metadata_folder import get_metadata_path
+
+MANIFEST_FILE_NAME = ".manifest.sqlite3"
+
+# "flat" - images are saved by name, "content" - images are saved by digest of their content.
+SAVE_LAYOUTS = ("flat", "content")
+
+# Files are read in blocks of this size when their digest is calculated.
+DIGEST_BLOCK_SIZE = 1024 * 1024
+
+
+def get_file_digest(path: str) -> str:
+    """
+    Returns digest of file content.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(DIGEST_BLOCK_SIZE), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+class ContentStore:
+    def __init__(self, folder_path: str) -> None:
+        """
+        Content-addressed layout of 'folder_path'.
+
+        Image is saved as 'ab/cd/abcd....ext' by digest of its content, so a file
+        with the same content is found by a single stat. Original names of images
+        are kept in a manifest stored in metadata folder of 'folder_path' as MANIFEST_FILE_NAME.
+        """
+        self.folder_path = folder_path
+        self.manifest_path = get_metadata_path(folder_path, MANIFEST_FILE_NAME)
+
+        self.connection = sqlite3.connect(self.manifest_path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS manifest ("
+                                "digest TEXT PRIMARY KEY, "
+                                "name TEXT NOT NULL, "
+                                "path TEXT NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS manifest_name ON manifest (name)")
+
+    def __enter__(self) -> "ContentStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def get_path(self, digest: str, extension: str) -> str:
+        """
+        Returns path of image with 'digest' in the folder.
+        """
+        return os.path.join(self.folder_path, digest[:2], digest[2:4], digest + extension.lower())
+
+    def add(self, path: str, digest: Optional[str] = None) -> Optional[str]:
+        """
+        Moves image at 'path' to the folder and returns its new path.
+
+        Returns None if image with the same content is already in the folder.
+
+        digest: digest of the file if it is already known, otherwise the file is read.
+        """
+        name = os.path.basename(path)
+        if digest is None:
+            digest = get_file_digest(path)
+        destination = self.get_path(digest, os.path.splitext(name)[1])
+
+        if os.path.exists(destination):
+            return None
+
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.rename(path, destination)
+
+        self.connection.execute("INSERT OR REPLACE INTO manifest VALUES (?, ?, ?)",
+                                (digest, name, os.path.relpath(destination, self.folder_path)))
+
+        return destination
+
+    def close(self) -> None:
+        """
+        Saves changes and closes the manifest.
+        """
+        self.connection.commit()
+        self.connection.close()
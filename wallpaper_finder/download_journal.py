@@ -0,0 +1,189 @@
+import json
+import os
+import time
+
+from threading import Lock
+
+from typing import Optional
+
+from .utils import FileUtils, ImageInfo
+from .atomic_file import write_atomic
+
+JOURNAL_FILE_NAME = ".download_journal.jsonl"
+
+QUEUED = "queued"
+LOADING = "loading"
+COMPLETE = "complete"
+
+
+class DownloadJournal:
+    """
+    Journal of image downloads in the temp folder, lets an interrupted run reuse loaded images.
+
+    Every change of state is appended to the journal as a json line, so a crash loses
+    at most the line being written. 'save' compacts the journal to the last state of every url.
+    """
+    # None disables the journal.
+    journal_path = None
+
+    _entries = {}
+    # Urls loaded by a previous run and urls of them that were reused by this one.
+    _resumed = set()
+    _reused = set()
+    _file = None
+    _lock = Lock()
+
+    @classmethod
+    def open(cls, folder_path: Optional[str]) -> None:
+        """
+        Opens journal in 'folder_path', drops entries of files that no longer exist
+        and removes files of downloads that were not finished. None disables the journal.
+        """
+        cls.close()
+
+        cls._entries = {}
+        cls._resumed = set()
+        cls._reused = set()
+
+        if not folder_path:
+            cls.journal_path = None
+            return
+
+        cls.journal_path = os.path.join(folder_path, JOURNAL_FILE_NAME)
+
+        entries = {}
+        try:
+            with open(cls.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Line was being written when the previous run crashed.
+                        continue
+
+                    entries[entry["url"]] = entry
+        except FileNotFoundError:
+            pass
+
+        for url, entry in entries.items():
+            if entry["state"] == COMPLETE and os.path.isfile(entry["image_info"]["path"]):
+                cls._entries[url] = entry
+                cls._resumed.add(url)
+
+            # Unfinished downloads are loaded again, their partial files are not needed.
+            elif entry["state"] == LOADING and entry.get("path"):
+                FileUtils.remove_files([entry["path"]])
+
+        cls.save()
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return cls.journal_path is not None
+
+    @classmethod
+    def get_completed(cls, url: str) -> Optional[ImageInfo]:
+        """
+        Returns info of image at 'url' if it was already loaded.
+        """
+        entry = cls._entries.get(url)
+
+        if entry is None or entry["state"] != COMPLETE:
+            return None
+
+        image_info = ImageInfo(**entry["image_info"])
+        cls._reused.add(url)
+
+        if image_info.hash is not None:
+            FileUtils.image_hashes[image_info.path] = image_info.hash
+        # Digest of a re-encoded image is not a digest of its file.
+        elif image_info.digest is not None:
+            FileUtils.image_digests[image_info.path] = image_info.digest
+
+        return image_info
+
+    @classmethod
+    def mark(cls, url: str, state: str, image_info: ImageInfo = None, path: str = None) -> None:
+        """
+        Records 'state' of download of 'url'.
+
+        path: temp file of a download that is not finished yet.
+        """
+        if not cls.is_enabled():
+            return
+
+        entry = {"url": url, "state": state, "time": time.time()}
+
+        if image_info:
+            entry["image_info"] = image_info._asdict()
+
+        if path:
+            entry["path"] = path
+
+        with cls._lock:
+            cls._entries[url] = entry
+            cls._append(entry)
+
+    @classmethod
+    def remove(cls, url: str) -> None:
+        """
+        Removes download of 'url' from the journal, e.g. after it failed.
+        """
+        if not cls.is_enabled():
+            return
+
+        with cls._lock:
+            if cls._entries.pop(url, None):
+                cls._append({"url": url, "state": None})
+
+    @classmethod
+    def get_unused_paths(cls) -> list:
+        """
+        Returns paths of images loaded by a previous run that were not listed by this one.
+        """
+        return [cls._entries[url]["image_info"]["path"]
+                for url in cls._resumed - cls._reused if url in cls._entries]
+
+    @classmethod
+    def _append(cls, entry: dict) -> None:
+        cls._file.write(json.dumps(entry) + "\n")
+        # Line reaches the os right away and survives a crash of the process.
+        cls._file.flush()
+
+    @classmethod
+    def save(cls) -> None:
+        """
+        Compacts journal, old journal is replaced only after new one is fully written.
+        """
+        if not cls.is_enabled():
+            return
+
+        with cls._lock:
+            if cls._file:
+                cls._file.close()
+
+            write_atomic(cls.journal_path,
+                         "".join(json.dumps(entry) + "\n" for entry in cls._entries.values()))
+
+            cls._file = open(cls.journal_path, "a", encoding="utf-8")
+
+    @classmethod
+    def close(cls) -> None:
+        with cls._lock:
+            if cls._file:
+                cls._file.close()
+                cls._file = None
+
+    @classmethod
+    def clear(cls) -> None:
+        """
+        Removes journal after loaded images were processed.
+        """
+        cls.close()
+
+        with cls._lock:
+            cls._entries = {}
+            cls._resumed = set()
+            cls._reused = set()
+
+        if cls.is_enabled() and os.path.isfile(cls.journal_path):
+            os.unlink(cls.journal_path)
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import random
+import time
+
+import aiohttp
+import requests
+
+from threading import Lock
+
+from PIL.Image import DecompressionBombError, DecompressionBombWarning
+from PIL import UnidentifiedImageError
+
+from typing import Iterator, NamedTuple, Optional
+
+from .metrics import Metrics
+from .atomic_file import write_atomic
+
+# Statuses that can go away on the next attempt, e.g. throttling or overloaded server.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Failure kinds that can go away on the next attempt.
+TRANSIENT_KINDS = ("timeout", "connection", "server_error")
+# Failure kinds that repeat on every attempt, they are never retried.
+PERMANENT_KINDS = ("http_error", "invalid_image", "rejected", "unsupported")
+
+
+class HttpStatusError(Exception):
+    """
+    Server responded with an error status.
+
+    retry_after: value of Retry-After header, used as delay before the next attempt.
+    """
+    def __init__(self, status: int, retry_after: Optional[str] = None) -> None:
+        super().__init__(f"Server responded with status {status}.")
+        self.status = status
+
+        try:
+            self.retry_after = float(retry_after)
+        except (TypeError, ValueError):
+            self.retry_after = None
+
+
+class InvalidImageError(Exception):
+    """
+    Downloaded image can't be decoded, e.g. its body is truncated or corrupt.
+    """
+
+
+# Errors after which loading of a single image is skipped, other errors stop loading.
+LOADING_ERRORS = (DecompressionBombWarning, DecompressionBombError, ValueError,
+                  UnidentifiedImageError, InvalidImageError, HttpStatusError,
+                  requests.RequestException, aiohttp.ClientError, asyncio.TimeoutError)
+
+
+def classify(error: BaseException) -> str:
+    """
+    Returns kind of failure caused by 'error'.
+    """
+    if isinstance(error, (requests.Timeout, asyncio.TimeoutError)):
+        return "timeout"
+
+    if isinstance(error, (requests.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                          aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                          ConnectionError)):
+        return "connection"
+
+    if isinstance(error, HttpStatusError):
+        return "server_error" if error.status in RETRY_STATUSES else "http_error"
+
+    if isinstance(error, (requests.RequestException, aiohttp.ClientError)):
+        return "http_error"
+
+    if isinstance(error, (DecompressionBombWarning, DecompressionBombError,
+                          UnidentifiedImageError, InvalidImageError)):
+        return "invalid_image"
+
+    if isinstance(error, ValueError):
+        return "rejected"
+
+    return "unsupported"
+
+
+class Failure(NamedTuple):
+    """
+    Image or submission that was not loaded. 'attempts' counts retries too.
+    """
+    url: str
+    kind: str
+    error: str
+    message: str
+    attempts: int
+
+    @property
+    def transient(self) -> bool:
+        return self.kind in TRANSIENT_KINDS
+
+    def __str__(self) -> str:
+        return self.url + " -> " + self.message
+
+
+class RetryPolicy:
+    """
+    Retries of reddit requests and image downloads that failed with a transient error.
+    """
+    # Failure kind -> max number of retries.
+    max_retries = {"timeout": 3, "connection": 3, "server_error": 5}
+    # Delay before the first retry, doubled after every next one.
+    backoff = 1.0
+    max_backoff = 60.0
+
+    @classmethod
+    def configure(cls, max_retries: dict, backoff: float) -> None:
+        """
+        Sets max number of retries of every transient failure kind and delay before the first retry.
+        """
+        for kind in max_retries:
+            if kind not in TRANSIENT_KINDS:
+                raise ValueError(f"Failures of kind '{kind}' are not retried, "
+                                 f"retried kinds: {', '.join(TRANSIENT_KINDS)}")
+
+        cls.max_retries = dict(max_retries)
+        cls.backoff = backoff
+
+    @classmethod
+    def get_delay(cls, error: BaseException, retries: dict) -> Optional[float]:
+        """
+        Returns delay before the next attempt after 'error' or None if it is not retried.
+
+        retries: number of retries made for every kind, updated by this call.
+        """
+        kind = classify(error)
+
+        made = retries.get(kind, 0)
+        if made >= cls.max_retries.get(kind, 0):
+            return None
+
+        retries[kind] = made + 1
+        Metrics.increment("retries", kind=kind)
+
+        if getattr(error, "retry_after", None) is not None:
+            return error.retry_after
+
+        attempt = sum(retries.values()) - 1
+
+        return min(cls.max_backoff, cls.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+class FailureCollector:
+    """
+    Failures of a run, shared by all threads.
+    """
+    # File written by 'write_report', None - not written.
+    report_path = None
+
+    def __init__(self) -> None:
+        self._failures = []
+        self._lock = Lock()
+
+    @classmethod
+    def set_report_path(cls, report_path: Optional[str]) -> None:
+        cls.report_path = report_path
+
+    def add(self, url: str, error: BaseException, attempts: int = 1) -> Failure:
+        failure = Failure(url=url,
+                          kind=classify(error),
+                          error=type(error).__name__,
+                          message=str(error),
+                          attempts=attempts)
+
+        with self._lock:
+            self._failures.append(failure)
+
+        return failure
+
+    def __len__(self) -> int:
+        return len(self._failures)
+
+    def __iter__(self) -> Iterator[Failure]:
+        with self._lock:
+            return iter(list(self._failures))
+
+    def get_counts(self) -> dict:
+        """
+        Returns number of failures of every kind.
+        """
+        counts = {}
+        for failure in self:
+            counts[failure.kind] = counts.get(failure.kind, 0) + 1
+
+        return counts
+
+    def get_report(self) -> dict:
+        failures = list(self)
+
+        return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "total": len(failures),
+                "transient": sum(failure.transient for failure in failures),
+                "kinds": self.get_counts(),
+                "failures": [dict(failure._asdict(), transient=failure.transient)
+                             for failure in failures]}
+
+    def write_report(self) -> None:
+        """
+        Writes JSON report of all failures to 'report_path'.
+        """
+        if not self.report_path:
+            return
+
+        write_atomic(self.report_path, json.dumps(self.get_report(), indent=4))
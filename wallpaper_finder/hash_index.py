@@ -0,0 +1,98 @@
+import os
+import sqlite3
+
+from typing import Optional
+
+from .metadata_folder import get_metadata_path
+
+INDEX_FILE_NAME = ".hash_index.sqlite3"
+
+# Version of stored hashes. Index is cleared when hashing algorithm changes.
+HASH_VERSION = 2
+
+
+class HashIndex:
+    def __init__(self, folder_path: str) -> None:
+        """
+        Persistent index of image hashes for files in 'folder_path'.
+
+        Index is stored in metadata folder of 'folder_path' as INDEX_FILE_NAME.
+        Entries are keyed by file path relative to the folder and stay valid while
+        file size and mtime are unchanged.
+        """
+        self.folder_path = folder_path
+        self.index_path = get_metadata_path(folder_path, INDEX_FILE_NAME)
+
+        self.connection = sqlite3.connect(self.index_path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS hashes ("
+                                "path TEXT PRIMARY KEY, "
+                                "size INTEGER NOT NULL, "
+                                "mtime INTEGER NOT NULL, "
+                                "hash TEXT NOT NULL)")
+
+        version, = self.connection.execute("PRAGMA user_version").fetchone()
+        if version != HASH_VERSION:
+            self.connection.execute("DELETE FROM hashes")
+            self.connection.execute(f"PRAGMA user_version = {HASH_VERSION}")
+
+        # All entries are loaded once, lookups are done in memory.
+        self.entries = {path: (size, mtime, image_hash) for path, size, mtime, image_hash
+                        in self.connection.execute("SELECT path, size, mtime, hash FROM hashes")}
+
+    def __enter__(self) -> "HashIndex":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(path, self.folder_path)
+
+    def get(self, path: str) -> Optional[str]:
+        """
+        Returns hash of image at 'path' if it is indexed and was not changed since.
+        """
+        entry = self.entries.get(self._key(path))
+        if entry is None:
+            return None
+
+        size, mtime, image_hash = entry
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        if stat.st_size != size or stat.st_mtime_ns != mtime:
+            return None
+
+        return image_hash
+
+    def set(self, path: str, image_hash: str) -> None:
+        """
+        Adds or updates hash of image at 'path'.
+        """
+        stat = os.stat(path)
+        key = self._key(path)
+
+        self.entries[key] = (stat.st_size, stat.st_mtime_ns, image_hash)
+        self.connection.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)",
+                                (key, stat.st_size, stat.st_mtime_ns, image_hash))
+
+    def prune(self, paths: list) -> None:
+        """
+        Removes entries of files that are not in 'paths'.
+        """
+        keep = {self._key(path) for path in paths}
+        removed = [(key, ) for key in self.entries if key not in keep]
+
+        for key, in removed:
+            del self.entries[key]
+
+        self.connection.executemany("DELETE FROM hashes WHERE path = ?", removed)
+
+    def close(self) -> None:
+        """
+        Saves changes and closes the index.
+        """
+        self.connection.commit()
+        self.connection.close()
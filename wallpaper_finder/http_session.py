@@ -0,0 +1,99 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from threading import Lock
+
+from typing import Optional
+
+
+class HttpSession:
+    """
+    Shared pooled session for all http requests.
+    """
+    # Number of hosts to keep connections to.
+    pool_connections = 16
+    # Number of connections kept to a single host.
+    pool_maxsize = 4
+    # Connect and read timeouts in seconds.
+    timeout = (10, 30)
+    keep_alive = True
+
+    _session = None
+    _lock = Lock()
+
+    @classmethod
+    def configure(cls, pool_maxsize: int, timeout: Optional[list] = None,
+                  keep_alive: bool = True, pool_connections: int = 16) -> None:
+        """
+        Sets pool size per host, (connect, read) timeouts, keep-alive
+        and number of hosts to keep connections to.
+
+        Must be called before the first request.
+        """
+        cls.pool_maxsize = pool_maxsize
+        cls.pool_connections = pool_connections
+        cls.keep_alive = keep_alive
+
+        if timeout:
+            cls.timeout = tuple(timeout)
+
+        cls._session = None
+
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        """
+        Returns shared session, creates it on the first call.
+        """
+        with cls._lock:
+            if cls._session is None:
+                session = requests.Session()
+
+                adapter = HTTPAdapter(pool_connections=cls.pool_connections,
+                                      pool_maxsize=cls.pool_maxsize)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+
+                if not cls.keep_alive:
+                    session.headers["Connection"] = "close"
+
+                cls._session = session
+
+            return cls._session
+
+    @classmethod
+    def request(cls, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", cls.timeout)
+
+        return cls.get_session().request(method, url, **kwargs)
+
+    @classmethod
+    def get(cls, url: str, **kwargs) -> requests.Response:
+        return cls.request("GET", url, **kwargs)
+
+    @classmethod
+    def post(cls, url: str, **kwargs) -> requests.Response:
+        return cls.request("POST", url, **kwargs)
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        """
+        Returns number of requests and opened connections of hosts that are still pooled.
+        """
+        requests_count = 0
+        connections_count = 0
+
+        if cls._session is not None:
+            for adapter in set(cls._session.adapters.values()):
+                pools = adapter.poolmanager.pools
+
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is None:
+                        continue
+
+                    requests_count += pool.num_requests
+                    connections_count += pool.num_connections
+
+        return {"requests": requests_count,
+                "new_connections": connections_count,
+                "reused_connections": requests_count - connections_count}
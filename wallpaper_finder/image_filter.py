@@ -0,0 +1,67 @@
+from typing import Optional
+
+
+class ImageFilter:
+    """
+    Rejects images by resolution and size before they are loaded.
+
+    Limits that are None are not checked.
+    """
+    # Names of limits that can be set by 'configure'.
+    LIMITS = ("min_width", "min_height", "max_width", "max_height",
+              "min_aspect_ratio", "max_aspect_ratio", "max_bytes")
+
+    min_width = None
+    min_height = None
+    max_width = None
+    max_height = None
+    # width / height
+    min_aspect_ratio = None
+    max_aspect_ratio = None
+    max_bytes = None
+
+    @classmethod
+    def configure(cls, limits: dict) -> None:
+        """
+        Sets limits from dict with keys from LIMITS.
+        """
+        for name, value in limits.items():
+            if name not in cls.LIMITS:
+                raise ValueError(f"Passed invalid {cls.__name__} limit '{name}'")
+
+            setattr(cls, name, value)
+
+    @classmethod
+    def check_resolution(cls, width: int, height: int) -> None:
+        """
+        Raises ValueError if image with 'width' and 'height' is not allowed.
+        """
+        if cls.min_width and width < cls.min_width or cls.min_height and height < cls.min_height:
+            raise ValueError(f"Resolution {width}x{height} is too small")
+
+        if cls.max_width and width > cls.max_width or cls.max_height and height > cls.max_height:
+            raise ValueError(f"Resolution {width}x{height} is too big")
+
+        aspect_ratio = width / height if height else 0
+
+        if cls.min_aspect_ratio and aspect_ratio < cls.min_aspect_ratio:
+            raise ValueError(f"Aspect ratio {aspect_ratio:.2f} is too small")
+
+        if cls.max_aspect_ratio and aspect_ratio > cls.max_aspect_ratio:
+            raise ValueError(f"Aspect ratio {aspect_ratio:.2f} is too big")
+
+    @classmethod
+    def check_bytes(cls, content_length: Optional[str]) -> None:
+        """
+        Raises ValueError if Content-Length is bigger than 'max_bytes'.
+        """
+        if not cls.max_bytes or content_length is None:
+            return
+
+        try:
+            size = int(content_length)
+        except ValueError:
+            return
+
+        if size > cls.max_bytes:
+            raise ValueError(f"Size {size} bytes is too big")
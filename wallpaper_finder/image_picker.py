@@ -0,0 +1,53 @@
+from .utils import ImageInfo
+from .image_filter import ImageFilter
+
+
+class ImagePicker(ImageFilter):
+    """
+    Picks loaded images by rules instead of the image viewer.
+
+    Resolution and aspect ratio are checked as in ImageFilter, but by the loaded image.
+    Rules that are None are not checked.
+    """
+    # Names of rules that can be set by 'configure'.
+    LIMITS = ("min_width", "min_height", "min_aspect_ratio", "max_aspect_ratio",
+              "subreddits", "min_score", "not_duplicate")
+
+    # Declared again, so limits of ImageFilter are not inherited.
+    min_width = None
+    min_height = None
+    max_width = None
+    max_height = None
+    # width / height
+    min_aspect_ratio = None
+    max_aspect_ratio = None
+    max_bytes = None
+    # Images only from these subreddits.
+    subreddits = None
+    min_score = None
+    # Duplicates of saved images are not saved, as with 'remove_duplicates'.
+    not_duplicate = False
+
+    @classmethod
+    def is_picked(cls, image_info: ImageInfo, post_info: dict) -> bool:
+        """
+        Checks if image with 'image_info' from submission with 'post_info' passes all rules.
+        """
+        try:
+            cls.check_resolution(image_info.width, image_info.height)
+        except ValueError:
+            return False
+
+        if cls.subreddits is not None:
+            subreddit = (post_info.get("subreddit") or "").lower()
+
+            if subreddit not in (s.lower() for s in cls.subreddits):
+                return False
+
+        if cls.min_score is not None:
+            score = post_info.get("score")
+
+            if score is None or score < cls.min_score:
+                return False
+
+        return True
@@ -0,0 +1,103 @@
+import json
+import os
+
+from .atomic_file import write_atomic
+from .metadata_folder import get_metadata_path
+
+CACHE_FILE_NAME = ".library_cache.json"
+
+# Version of cache format. Cache is rebuilt when format changes.
+CACHE_VERSION = 1
+
+
+class LibraryScanner:
+    def __init__(self, folder_path: str) -> None:
+        """
+        Lists files in 'folder_path' and its subfolders.
+
+        Listing of every folder is cached in metadata folder as CACHE_FILE_NAME with
+        folder mtime. On the next scans only folders which mtime changed are listed
+        again, others cost a single stat. Hidden files and folders are skipped.
+        """
+        self.folder_path = folder_path
+        self.cache_path = get_metadata_path(folder_path, CACHE_FILE_NAME)
+
+        # Relative folder path -> {"mtime": mtime_ns, "files": [names], "dirs": [names]}
+        self.folders = self._load()
+        self.changed = False
+
+    def _load(self) -> dict:
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                cache = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+        if cache.get("version") != CACHE_VERSION:
+            return {}
+
+        return cache["folders"]
+
+    def _save(self) -> None:
+        write_atomic(self.cache_path, json.dumps({"version": CACHE_VERSION, "folders": self.folders}))
+
+    def _list_folder(self, folder: str, mtime: int) -> dict:
+        files = []
+        dirs = []
+
+        with os.scandir(os.path.join(self.folder_path, folder)) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                elif entry.is_file():
+                    files.append(entry.name)
+
+        self.changed = True
+
+        return {"mtime": mtime, "files": files, "dirs": dirs}
+
+    def scan(self, extensions: list) -> list:
+        """
+        Returns paths of files with 'extensions' in the folder and its subfolders.
+        """
+        extensions = set(extensions)
+        scanned = {}
+
+        # Folders are listed again only if their mtime changed,
+        # but subfolders are always checked as their changes don't change parent mtime.
+        stack = [(".", os.stat(self.folder_path).st_mtime_ns)]
+        while stack:
+            folder, mtime = stack.pop()
+
+            listing = self.folders.get(folder)
+            if listing is None or listing["mtime"] != mtime:
+                listing = self._list_folder(folder, mtime)
+
+            scanned[folder] = listing
+
+            for name in listing["dirs"]:
+                subfolder = os.path.normpath(os.path.join(folder, name))
+
+                try:
+                    stat = os.stat(os.path.join(self.folder_path, subfolder))
+                except FileNotFoundError:
+                    continue
+
+                stack.append((subfolder, stat.st_mtime_ns))
+
+        if self.changed or scanned.keys() != self.folders.keys():
+            self.folders = scanned
+            self._save()
+
+        paths = []
+        for folder, listing in scanned.items():
+            folder_path = self.folder_path if folder == "." else os.path.join(self.folder_path, folder)
+
+            for name in listing["files"]:
+                if os.path.splitext(name)[1] in extensions:
+                    paths.append(os.path.join(folder_path, name))
+
+        return paths
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import time
+
+import requests
+
+from typing import Optional
+
+from .atomic_file import write_atomic
+
+
+class ListingCache:
+    """
+    On-disk cache of subreddit listing responses.
+    """
+    # None disables the cache.
+    cache_folder_path = None
+
+    # Seconds listings stay fresh without asking reddit, by "sort_type/time_filter" or "sort_type".
+    ttls = {}
+
+    @classmethod
+    def set_cache_folder_path(cls, path: Optional[str]) -> None:
+        """
+        Sets folder for cached listings. None disables the cache.
+        """
+        if path and not os.path.isdir(path):
+            os.makedirs(path)
+
+        cls.cache_folder_path = path
+
+    @classmethod
+    def set_ttls(cls, ttls: dict) -> None:
+        """
+        Sets listing ttls in seconds, keys are "sort_type/time_filter" or "sort_type".
+        """
+        cls.ttls = ttls
+
+    @classmethod
+    def get_ttl(cls, sort_type: str, time_filter: str) -> Optional[int]:
+        ttl = cls.ttls.get(f"{sort_type}/{time_filter}")
+
+        if ttl is None:
+            ttl = cls.ttls.get(sort_type)
+
+        return ttl
+
+    @classmethod
+    def _get_entry_path(cls, url: str, params: dict) -> str:
+        key = url + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+        return os.path.join(cls.cache_folder_path, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    @classmethod
+    def load(cls, url: str, params: dict) -> Optional[dict]:
+        """
+        Returns cached entry of request or None.
+        """
+        if not cls.cache_folder_path:
+            return None
+
+        try:
+            with open(cls._get_entry_path(url, params), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @classmethod
+    def is_fresh(cls, entry: dict, sort_type: str, time_filter: str) -> bool:
+        """
+        Checks if 'entry' can be used without revalidation.
+
+        User ttl of the listing is used if it is set, otherwise Cache-Control max-age.
+        """
+        ttl = cls.get_ttl(sort_type, time_filter)
+
+        if ttl is None:
+            ttl = entry["max_age"]
+
+        return time.time() < entry["stored"] + ttl
+
+    @classmethod
+    def get_validators(cls, entry: Optional[dict]) -> dict:
+        """
+        Returns conditional request headers for 'entry'.
+        """
+        headers = {}
+
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        return headers
+
+    @classmethod
+    def store(cls, url: str, params: dict, response: requests.Response, body: dict) -> None:
+        """
+        Saves response 'body' with its validators unless Cache-Control forbids it.
+        """
+        if not cls.cache_folder_path:
+            return
+
+        cache_control = parse_cache_control(response.headers.get("Cache-Control", ""))
+        if "no-store" in cache_control:
+            return
+
+        max_age = 0
+        if "no-cache" not in cache_control:
+            try:
+                max_age = int(cache_control.get("max-age", 0))
+            except ValueError:
+                max_age = 0
+
+        entry = {"etag": response.headers.get("ETag"),
+                 "last_modified": response.headers.get("Last-Modified"),
+                 "max_age": max_age,
+                 "stored": time.time(),
+                 "body": body}
+
+        cls._write(cls._get_entry_path(url, params), entry)
+
+    @classmethod
+    def refresh(cls, url: str, params: dict, entry: dict) -> None:
+        """
+        Marks 'entry' as just validated.
+        """
+        entry["stored"] = time.time()
+
+        cls._write(cls._get_entry_path(url, params), entry)
+
+    def _write(path: str, entry: dict) -> None:
+        write_atomic(path, json.dumps(entry))
+
+
+def parse_cache_control(header: str) -> dict:
+    """
+    Parses Cache-Control header to dict of directive: value. Directives without value map to None.
+    """
+    directives = {}
+
+    for directive in header.split(","):
+        name, _, value = directive.strip().partition("=")
+
+        if name:
+            directives[name.lower()] = value.strip('"') if value else None
+
+    return directives
@@ -0,0 +1,24 @@
+import os
+
+# Hidden folder for hash index, manifest and listing cache of a picture folder.
+# Files written there don't change mtime of the picture folder itself,
+# so LibraryScanner doesn't list the picture folder again because of them.
+METADATA_FOLDER_NAME = ".wallpaper_finder"
+
+
+def get_metadata_path(folder_path: str, file_name: str) -> str:
+    """
+    Returns path of metadata file 'file_name' of 'folder_path', creates metadata folder.
+
+    File stored right in 'folder_path' by older versions is moved to metadata folder.
+    """
+    metadata_folder_path = os.path.join(folder_path, METADATA_FOLDER_NAME)
+    os.makedirs(metadata_folder_path, exist_ok=True)
+
+    path = os.path.join(metadata_folder_path, file_name)
+
+    old_path = os.path.join(folder_path, file_name)
+    if os.path.isfile(old_path) and not os.path.exists(path):
+        os.replace(old_path, path)
+
+    return path
@@ -0,0 +1,178 @@
+import json
+import math
+import time
+
+from contextlib import contextmanager
+from threading import Lock
+
+from typing import Iterator, Optional
+
+from .atomic_file import write_atomic
+
+PROMETHEUS_PREFIX = "wallpaper_finder_"
+
+# Upper bounds of histogram buckets in Prometheus export, in seconds.
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def percentile(values: list, percent: float) -> float:
+    """
+    Nearest-rank percentile of sorted 'values'.
+    """
+    rank = max(0, math.ceil(percent / 100 * len(values)) - 1)
+
+    return values[rank]
+
+
+class Metrics:
+    """
+    Counters and histograms of the current run, shared by all threads.
+
+    Metrics are keyed by name and labels, e.g. Metrics.increment("failures", cause="timeout").
+    """
+    # Files written by 'write', None - not written.
+    summary_path = None
+    prometheus_path = None
+
+    _counters = {}
+    # Histograms keep all observed values, a run observes at most a few thousands of them.
+    _histograms = {}
+    _started = time.time()
+    _lock = Lock()
+
+    @classmethod
+    def set_output_paths(cls, summary_path: Optional[str], prometheus_path: Optional[str]) -> None:
+        """
+        Sets files for JSON run summary and Prometheus text format. None disables a file.
+        """
+        cls.summary_path = summary_path
+        cls.prometheus_path = prometheus_path
+
+    @classmethod
+    def increment(cls, name: str, value: float = 1, **labels) -> None:
+        """
+        Adds 'value' to counter 'name'.
+        """
+        key = (name, tuple(sorted(labels.items())))
+
+        with cls._lock:
+            cls._counters[key] = cls._counters.get(key, 0) + value
+
+    @classmethod
+    def observe(cls, name: str, value: float, **labels) -> None:
+        """
+        Adds 'value' to histogram 'name'.
+        """
+        key = (name, tuple(sorted(labels.items())))
+
+        with cls._lock:
+            cls._histograms.setdefault(key, []).append(value)
+
+    @classmethod
+    @contextmanager
+    def timer(cls, name: str, **labels) -> Iterator[None]:
+        """
+        Observes seconds spent in the block in histogram 'name'.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.observe(name, time.perf_counter() - start, **labels)
+
+    @classmethod
+    def get_summary(cls) -> dict:
+        """
+        Returns run summary: counters and count, sum, mean, p50, p95, max of histograms.
+        """
+        with cls._lock:
+            counters = dict(cls._counters)
+            histograms = {key: sorted(values) for key, values in cls._histograms.items()}
+
+        summary = {"started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(cls._started)),
+                   "duration": round(time.time() - cls._started, 3),
+                   "counters": [],
+                   "histograms": []}
+
+        for (name, labels), value in sorted(counters.items()):
+            summary["counters"].append({"name": name, "labels": dict(labels), "value": value})
+
+        for (name, labels), values in sorted(histograms.items()):
+            summary["histograms"].append({"name": name,
+                                          "labels": dict(labels),
+                                          "count": len(values),
+                                          "sum": round(sum(values), 6),
+                                          "mean": round(sum(values) / len(values), 6),
+                                          "p50": round(percentile(values, 50), 6),
+                                          "p95": round(percentile(values, 95), 6),
+                                          "max": round(values[-1], 6)})
+
+        return summary
+
+    @classmethod
+    def get_prometheus_text(cls) -> str:
+        """
+        Returns metrics in Prometheus text format, counters get '_total' suffix.
+        """
+        with cls._lock:
+            counters = dict(cls._counters)
+            histograms = {key: sorted(values) for key, values in cls._histograms.items()}
+
+        lines = []
+        typed = set()
+
+        for (name, labels), value in sorted(counters.items()):
+            name = PROMETHEUS_PREFIX + name + "_total"
+
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+
+            lines.append(f"{name}{format_labels(labels)} {value}")
+
+        for (name, labels), values in sorted(histograms.items()):
+            name = PROMETHEUS_PREFIX + name
+
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+
+            count = 0
+            for bound in HISTOGRAM_BUCKETS:
+                while count < len(values) and values[count] <= bound:
+                    count += 1
+
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)), ))} {count}")
+
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'), ))} {len(values)}")
+            lines.append(f"{name}_sum{format_labels(labels)} {sum(values)}")
+            lines.append(f"{name}_count{format_labels(labels)} {len(values)}")
+
+        name = PROMETHEUS_PREFIX + "last_run_timestamp_seconds"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {cls._started}")
+
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def write(cls) -> None:
+        """
+        Writes JSON run summary and Prometheus text file to 'summary_path' and 'prometheus_path'.
+
+        Files are replaced only after they are fully written, so node-exporter never reads half of them.
+        """
+        if cls.summary_path:
+            write_atomic(cls.summary_path, json.dumps(cls.get_summary(), indent=4))
+
+        if cls.prometheus_path:
+            write_atomic(cls.prometheus_path, cls.get_prometheus_text())
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+
+    def escape(value: str) -> str:
+        return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
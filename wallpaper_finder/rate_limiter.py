@@ -0,0 +1,141 @@
+import random
+import time
+
+import requests
+
+from threading import Lock
+
+from .http_session import HttpSession
+from .failures import HttpStatusError, RetryPolicy, RETRY_STATUSES
+
+# Max random delay in seconds added to every wait, so waiting threads don't wake up together.
+JITTER = 0.25
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all requests to reddit.
+
+    Rate is adapted to X-Ratelimit-Remaining and X-Ratelimit-Reset headers of responses.
+    """
+    # Requests per second until reddit reports its limits.
+    rate = 1.0
+    # Requests that can be made at once.
+    burst = 5
+
+    _tokens = burst
+    _updated = time.monotonic()
+    _blocked_until = 0.0
+    _lock = Lock()
+
+    @classmethod
+    def configure(cls, requests_per_minute: float) -> None:
+        """
+        Sets initial request rate.
+        """
+        if requests_per_minute <= 0:
+            raise ValueError("Requests per minute should be positive")
+
+        cls.rate = requests_per_minute / 60
+
+    @classmethod
+    def acquire(cls) -> None:
+        """
+        Waits until request can be made.
+        """
+        while True:
+            with cls._lock:
+                now = time.monotonic()
+
+                if now >= cls._blocked_until:
+                    elapsed = now - cls._updated
+                    cls._tokens = min(cls.burst, cls._tokens + elapsed * cls.rate)
+                    cls._updated = now
+
+                    if cls._tokens >= 1:
+                        cls._tokens -= 1
+                        return
+
+                    wait = (1 - cls._tokens) / cls.rate
+                else:
+                    wait = cls._blocked_until - now
+
+            time.sleep(wait + random.uniform(0, JITTER))
+
+    @classmethod
+    def block(cls, seconds: float) -> None:
+        """
+        Stops all requests for 'seconds'.
+        """
+        with cls._lock:
+            blocked_until = time.monotonic() + seconds
+
+            if blocked_until > cls._blocked_until:
+                cls._blocked_until = blocked_until
+                cls._updated = blocked_until
+
+                # Only one request is made right after the block.
+                cls._tokens = 1
+
+    @classmethod
+    def update(cls, response: requests.Response) -> None:
+        """
+        Adapts rate to the quota left in the current window.
+        """
+        try:
+            remaining = float(response.headers["X-Ratelimit-Remaining"])
+            reset = float(response.headers["X-Ratelimit-Reset"])
+        except (KeyError, ValueError):
+            return
+
+        if remaining < 1:
+            cls.block(reset)
+            return
+
+        with cls._lock:
+            cls.rate = remaining / max(reset, 1)
+
+    @classmethod
+    def request(cls, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Makes request through HttpSession when quota allows it.
+
+        Connection errors, timeouts and RETRY_STATUSES are retried as RetryPolicy allows.
+        Response with RETRY_STATUSES is returned when retries are over.
+        """
+        retries = {}
+
+        while True:
+            cls.acquire()
+
+            try:
+                response = HttpSession.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                delay = RetryPolicy.get_delay(e, retries)
+                if delay is None:
+                    raise e
+
+                time.sleep(delay)
+                continue
+
+            cls.update(response)
+
+            if response.status_code not in RETRY_STATUSES:
+                return response
+
+            delay = RetryPolicy.get_delay(HttpStatusError(response.status_code,
+                                                          response.headers.get("Retry-After")),
+                                          retries)
+            if delay is None:
+                return response
+
+            # Throttled or failed server stops all requests.
+            cls.block(delay)
+
+    @classmethod
+    def get(cls, url: str, **kwargs) -> requests.Response:
+        return cls.request("GET", url, **kwargs)
+
+    @classmethod
+    def post(cls, url: str, **kwargs) -> requests.Response:
+        return cls.request("POST", url, **kwargs)
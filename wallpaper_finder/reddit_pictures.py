@@ -1,9 +1,19 @@
-from .utils import FileUtils
+from .utils import FileUtils, ImageInfo
+from .async_loader import AsyncImageLoader, URL_QUEUE_SIZE
+from .http_session import HttpSession
+from .rate_limiter import RateLimiter
+from .listing_cache import ListingCache
+from .url_ledger import UrlLedger
+from .image_filter import ImageFilter
+from .download_journal import DownloadJournal, QUEUED, LOADING, COMPLETE
+from .metrics import Metrics
+from .failures import FailureCollector, RetryPolicy, LOADING_ERRORS
+
+import time
+
+from queue import Queue
+from threading import Thread
 
-from multiprocessing.pool import ThreadPool
-from functools import partial
-
-import requests
 from urllib.parse import ParseResult, urlparse
 
 from os.path import basename, splitext
@@ -12,9 +22,8 @@ from alive_progress import alive_bar
 
 import warnings
 from PIL.Image import DecompressionBombWarning
-from PIL import UnidentifiedImageError
 
-from typing import Callable
+from typing import Callable, Iterator
 
 
 class RedditPicturesLoader():
@@ -33,7 +42,12 @@ class RedditPicturesLoader():
         self.limit = limit
         self.time_filter = time_filter
 
-        self.errors = []
+        self.errors = FailureCollector()
+
+        # Submission data, resolution from submission data and source url of every image.
+        self.post_info = {}
+        self.image_resolutions = {}
+        self.source_urls = {}
 
     def get_user_agent(self) -> str:
         return "Wallpaper finder"
@@ -47,6 +61,9 @@ class RedditPicturesLoader():
     def get_json_submissions(self, subreddit_name: str, limit: int, after: str = "null") -> dict:
         """
         Gets submissions from 'subreddit_name' in a form of json.
+
+        Responses are cached in ListingCache and revalidated with ETag and Last-Modified.
+        Requests are scheduled by RateLimiter.
         """
         url = self.make_request_url(subreddit_name)
 
@@ -56,11 +73,35 @@ class RedditPicturesLoader():
                   "limit": limit,
                   "after": after}
 
-        request = requests.get(url,
-                               headers=self.get_headers(),
-                               params=params)
+        cached = ListingCache.load(url, params)
+        if cached and ListingCache.is_fresh(cached, self.sort_type, self.time_filter):
+            Metrics.increment("listing_cache_hits", kind="fresh")
+            return cached["body"]
+
+        headers = self.get_headers()
+        headers.update(ListingCache.get_validators(cached))
+
+        with Metrics.timer("listing_seconds"):
+            request = RateLimiter.get(url,
+                                      headers=headers,
+                                      params=params)
+
+        # Listing did not change since it was cached.
+        if cached and request.status_code == 304:
+            Metrics.increment("listing_cache_hits", kind="revalidated")
+            ListingCache.refresh(url, params, cached)
+            return cached["body"]
 
-        return request.json()
+        Metrics.increment("listing_cache_misses")
+
+        # Otherwise error page would be parsed as a listing.
+        request.raise_for_status()
+
+        json_submissions = request.json()
+
+        ListingCache.store(url, params, request, json_submissions)
+
+        return json_submissions
 
     def __proccess_metadata(self, media_metadata: dict) -> list:
         image_urls = []
@@ -71,6 +112,10 @@ class RedditPicturesLoader():
             image_url = f"https://i.redd.it/{media_id}.{image_ext}"
             image_urls.append(image_url)
 
+            source = media_metadata[media_id].get('s', {})
+            if source.get('x') and source.get('y'):
+                self.image_resolutions[image_url] = (source['x'], source['y'])
+
         return image_urls
 
     def process_imgur_url(self, url: ParseResult) -> str:
@@ -98,9 +143,20 @@ class RedditPicturesLoader():
 
         return self.__proccess_metadata(metadata)
 
+    def get_post_info(self, post: dict) -> dict:
+        """
+        Returns submission data kept for every image url of 'post'.
+        """
+        return {"id": post['data'].get('id'),
+                "subreddit": post['data'].get('subreddit'),
+                "score": post['data'].get('score')}
+
     def extract_image_urls(self, json_submissions: dict) -> list:
         """
         Parses json for image download links.
+
+        Links from UrlLedger and links to images with resolution
+        rejected by ImageFilter are skipped.
         """
         image_urls = []
 
@@ -108,6 +164,10 @@ class RedditPicturesLoader():
             try:
                 post_url = post['data']['url']
 
+                if UrlLedger.is_known(post_url):
+                    Metrics.increment("ledger_skips")
+                    continue
+
                 parsed_url = urlparse(post_url)
 
                 if post['data'].get('is_video') or "v." in parsed_url.netloc:
@@ -117,27 +177,52 @@ class RedditPicturesLoader():
                 parsed_url = parsed_url._replace(query="")
 
                 if "i." in parsed_url.netloc and splitext(parsed_url.path)[1]:
-                    image_urls.append(parsed_url.geturl())
+                    post_image_urls = [parsed_url.geturl()]
 
                 elif "imgur.com" in parsed_url.netloc:
-                    image_urls.append(self.process_imgur_url(parsed_url))
+                    post_image_urls = [self.process_imgur_url(parsed_url)]
 
                 elif "reddit" in parsed_url.netloc:
-                    image_urls += self.process_reddit_url(parsed_url, post)
+                    post_image_urls = self.process_reddit_url(parsed_url, post)
                 else:
                     raise TypeError("Unknown link.")
 
+                preview = post['data'].get('preview', {}).get('images')
+                if len(post_image_urls) == 1 and preview:
+                    source = preview[0].get('source', {})
+                    if source.get('width') and source.get('height'):
+                        self.image_resolutions[post_image_urls[0]] = (source['width'], source['height'])
+
+                post_info = self.get_post_info(post)
+
+                for image_url in post_image_urls:
+                    if UrlLedger.is_known(image_url):
+                        Metrics.increment("ledger_skips")
+                        continue
+
+                    resolution = self.image_resolutions.get(image_url)
+                    if resolution:
+                        try:
+                            ImageFilter.check_resolution(*resolution)
+                        except ValueError as e:
+                            Metrics.increment("filtered_images")
+                            self.errors.add(image_url, e)
+                            continue
+
+                    self.post_info[image_url] = post_info
+                    image_urls.append(image_url)
+
             except TypeError as e:
-                self.errors.append(post_url + " -> " + str(e))
+                self.errors.add(post_url, e)
+                UrlLedger.record(post_url, post['data'].get('id'), "failed")
 
         return image_urls
 
-    def __handle_submissions(self, subreddit_name: str, bar: Callable[[], None] = None) -> list:
+    def __handle_submissions(self, subreddit_name: str,
+                             bar: Callable[[], None] = None) -> Iterator[list]:
         """
-        Makes list of image urls adding them by a 100 because of request limitations.
+        Yields image urls page by page, a page has 100 submissions because of request limitations.
         """
-        image_urls = []
-
         after = "null"
 
         for limit in range(self.limit, 0, -100):
@@ -145,7 +230,7 @@ class RedditPicturesLoader():
 
             json_submissions = self.get_json_submissions(subreddit_name, request_limit, after)
 
-            image_urls += self.extract_image_urls(json_submissions)
+            yield self.extract_image_urls(json_submissions)
 
             after = json_submissions["data"]["after"]
 
@@ -160,60 +245,210 @@ class RedditPicturesLoader():
         if bar:
             bar(1)
 
-        return image_urls
-
-    def get_image_urls(self, subreddit_name: str, verbose: bool) -> list:
+    def iter_image_urls(self, subreddit_name: str, bar: Callable[[], None] = None) -> Iterator[list]:
+        """
+        Yields image urls from 'subreddit_name' as soon as every page is loaded.
+        """
         try:
-            if verbose:
-                print(f"\nFetching urls from r/{subreddit_name}:")
-                with alive_bar(bar="blocks", spinner="long_message", manual=True) as bar:
-                    image_urls = self.__handle_submissions(subreddit_name, bar)
-
-                print()
-            else:
-                image_urls = self.__handle_submissions(subreddit_name)
+            yield from self.__handle_submissions(subreddit_name, bar)
         except KeyError as e:
             print("Probably passed invalid parameter to 'sort_type' or 'time_filter'.")
             raise e
 
+    def __count_image_urls(self, subreddit_name: str, verbose: bool) -> Iterator[list]:
+        """
+        Yields pages of 'iter_image_urls', in verbose mode prints number of urls at the end.
+
+        Listed urls are recorded in DownloadJournal as queued.
+        """
+        count = 0
+        for page in self.iter_image_urls(subreddit_name):
+            count += len(page)
+
+            for image_url in page:
+                if not DownloadJournal.get_completed(image_url):
+                    DownloadJournal.mark(image_url, QUEUED)
+
+            yield page
+
         if verbose:
-            if self.limit != len(image_urls):
-                print(f"Got {len(image_urls)} image urls\n")
+            print(f"Got {count} image urls from r/{subreddit_name}")
 
-        return image_urls
+    def __add_loaded(self, image_url: str, image_info: ImageInfo) -> None:
+        Metrics.increment("loaded_images")
 
-    def __process_submission(self, image_url: str, bar: Callable[[], None]) -> None:
-        try:
-            image_name = basename(image_url)
+        self.loaded.append(image_info.path)
+        self.image_info[image_info.path] = image_info
+        self.source_urls[image_info.path] = image_url
+
+        if self.on_loaded:
+            self.on_loaded(image_info)
+
+    def __add_error(self, image_url: str, error: BaseException, attempts: int) -> None:
+        failure = self.errors.add(image_url, error, attempts)
+        Metrics.increment("failures", kind=failure.kind)
 
-            file_path = FileUtils.save_image_from_url(image_url, image_name)
+        # Urls that failed with a transient error are loaded again by the next run.
+        # Rejected urls are not recorded either, as urls filtered by listed resolution,
+        # so they are loaded again when 'image_filter' is relaxed.
+        if not failure.transient and failure.kind != "rejected":
+            self.__record_outcome(image_url, "failed")
 
-            self.loaded.append(file_path)
-        except (DecompressionBombWarning, ValueError, UnidentifiedImageError) as e:
-            self.errors.append(image_url + " -> " + str(e))
+    def __record_outcome(self, image_url: str, outcome: str) -> None:
+        post_id = self.post_info.get(image_url, {}).get("id")
+
+        UrlLedger.record(image_url, post_id, outcome)
+
+    def get_image_post_info(self, image_path: str) -> dict:
+        """
+        Returns submission data of loaded image at 'image_path'.
+        """
+        return self.post_info.get(self.source_urls.get(image_path), {})
+
+    def record_outcome(self, image_paths: list, outcome: str) -> None:
+        """
+        Records 'outcome' of loaded images at 'image_paths' in UrlLedger.
+        """
+        for image_path in image_paths:
+            image_url = self.source_urls.get(image_path)
+
+            if image_url:
+                self.__record_outcome(image_url, outcome)
+
+    def __process_submission(self, image_url: str, bar: Callable[[], None]) -> None:
+        # Image was loaded by an interrupted run.
+        image_info = DownloadJournal.get_completed(image_url)
+        if image_info:
+            Metrics.increment("journal_hits")
+            self.__add_loaded(image_url, image_info)
+            bar()
+            return
+
+        file_path = FileUtils.get_temp_file_path(basename(image_url))
+        DownloadJournal.mark(image_url, LOADING, path=file_path)
+
+        # Transient failures are retried by RetryPolicy.
+        retries = {}
+        while True:
+            try:
+                with Metrics.timer("download_seconds"):
+                    image_info = FileUtils.save_image_from_url(image_url, file_path)
+            except LOADING_ERRORS as e:
+                delay = RetryPolicy.get_delay(e, retries)
+                if delay is not None:
+                    time.sleep(delay)
+                    continue
+
+                FileUtils.remove_files([file_path])
+                DownloadJournal.remove(image_url)
+                self.__add_error(image_url, e, sum(retries.values()) + 1)
+            else:
+                DownloadJournal.mark(image_url, COMPLETE, image_info)
+                self.__add_loaded(image_url, image_info)
+
+            break
 
         bar()
 
-    def load_pictures(self, subreddits: list, verbose: bool = False) -> list:
+    def __load_with_threads(self, subreddits: list, verbose: bool, bar: Callable[[], None]) -> None:
+        """
+        Lists every subreddit in its own thread and loads urls as soon as they are listed
+        with 'number_of_threads' threads.
+        """
+        image_urls = Queue(maxsize=URL_QUEUE_SIZE)
+        failures = []
+
+        def list_subreddit(subreddit: str) -> None:
+            try:
+                for page in self.__count_image_urls(subreddit, verbose):
+                    for image_url in page:
+                        image_urls.put(image_url)
+            except BaseException as e:
+                failures.append(e)
+
+        def load_images() -> None:
+            while True:
+                image_url = image_urls.get()
+                if image_url is None:
+                    return
+
+                try:
+                    self.__process_submission(image_url, bar)
+                except BaseException as e:
+                    failures.append(e)
+
+        listers = [Thread(target=list_subreddit, args=(subreddit, ), daemon=True)
+                   for subreddit in subreddits]
+        loaders = [Thread(target=load_images, daemon=True)
+                   for _ in range(FileUtils.number_of_threads)]
+
+        for thread in listers + loaders:
+            thread.start()
+
+        for thread in listers:
+            thread.join()
+
+        # Stops loaders after all urls are loaded.
+        for _ in loaders:
+            image_urls.put(None)
+
+        for thread in loaders:
+            thread.join()
+
+        if failures:
+            raise failures[0]
+
+    def __load_with_asyncio(self, subreddits: list, verbose: bool, bar: Callable[[], None]) -> None:
+        """
+        Lists and loads images of all subreddits in a single event loop.
+        """
+        def on_loaded(image_url: str, image_info: ImageInfo) -> None:
+            self.__add_loaded(image_url, image_info)
+            bar()
+
+        def on_error(image_url: str, error: BaseException, attempts: int) -> None:
+            self.__add_error(image_url, error, attempts)
+            bar()
+
+        pages = [self.__count_image_urls(subreddit, verbose) for subreddit in subreddits]
+
+        AsyncImageLoader(on_loaded, on_error).run(pages)
+
+    def load_pictures(self, subreddits: list, verbose: bool = False,
+                      on_loaded: Callable[[ImageInfo], None] = None) -> list:
+        """
+        Loads images from 'subreddits' to the temp folder and returns paths to them.
+
+        on_loaded: called with info of every image as soon as it is loaded.
+        """
         # Treats Pictures with a lot of pixels as error.
         warnings.simplefilter("error", DecompressionBombWarning)
 
         self.loaded = []
+        self.image_info = {}
+        self.on_loaded = on_loaded
         try:
-            for subreddit in subreddits:
-                image_urls = self.get_image_urls(subreddit, verbose)
-
-                print(f"Loading images from r/{subreddit}:")
-                with alive_bar(len(image_urls), bar="classic2") as bar:
-                    part = partial(self.__process_submission, bar=bar)
+            print(f"Loading images from {', '.join('r/' + s for s in subreddits)}:")
+            with alive_bar(bar="classic2") as bar:
+                if FileUtils.download_engine == "asyncio":
+                    self.__load_with_asyncio(subreddits, verbose, bar)
+                else:
+                    self.__load_with_threads(subreddits, verbose, bar)
 
-                    with ThreadPool(FileUtils.number_of_threads) as pool:
-                        pool.map(part, image_urls)
+            DownloadJournal.save()
 
             print()
             if verbose:
+                # With asyncio engine images are loaded by aiohttp, which is not counted.
+                if FileUtils.download_engine != "asyncio":
+                    stats = HttpSession.get_stats()
+                    print("Made {requests} requests, opened {new_connections} connections, "
+                          "reused {reused_connections} times.\n".format(**stats))
+
                 if self.errors:
                     print(f"Loaded only {len(self.loaded)} files...")
+                    print("Failures: " + ", ".join(f"{kind} - {count}"
+                                                   for kind, count in self.errors.get_counts().items()))
                     print("Can't load this files:")
                     for error in self.errors:
                         print(error)
@@ -223,5 +458,10 @@ class RedditPicturesLoader():
 
         except BaseException as e:
             print("oh no ( ͡• ͜ʖ ͡• )")
-            FileUtils.remove_files(self.loaded)
+
+            # Loaded images are reused by the next run.
+            if DownloadJournal.is_enabled():
+                DownloadJournal.save()
+            else:
+                FileUtils.remove_files(self.loaded)
             raise e
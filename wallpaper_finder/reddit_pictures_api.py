@@ -1,6 +1,8 @@
 import requests
 
 from .reddit_pictures import RedditPicturesLoader
+from .rate_limiter import RateLimiter
+from .token_manager import TokenManager
 
 
 class RedditPicturesLoaderApi(RedditPicturesLoader):
@@ -21,35 +23,55 @@ class RedditPicturesLoaderApi(RedditPicturesLoader):
         self.client_id = credentials["client_id"]
         self.client_secret = credentials["client_secret"]
 
-        self.authorization = self.get_authorization()
+        # Uses cached token if it is still valid.
+        self.token_manager = TokenManager(self.client_id, self.request_token)
 
     def get_authorization_url(self) -> str:
         return "https://www.reddit.com/api/v1/access_token"
 
-    def get_authorization(self) -> str:
+    def request_token(self) -> dict:
         """
-        Authorizes in reddit api and returns authorization header.
+        Authorizes in reddit api and returns token json.
         """
         post_data = {"grant_type": "client_credentials"}
 
         client_auth = requests.auth.HTTPBasicAuth(self.client_id,
                                                   self.client_secret)
 
-        response = requests.post(self.get_authorization_url(),
-                                 auth=client_auth,
-                                 data=post_data,
-                                 headers={"User-Agent": "Wallpaper finder"})
+        response = RateLimiter.post(self.get_authorization_url(),
+                                    auth=client_auth,
+                                    data=post_data,
+                                    headers={"User-Agent": "Wallpaper finder"})
+        response.raise_for_status()
 
-        r_json = response.json()
+        return response.json()
 
-        return r_json["token_type"] + " " + r_json["access_token"]
+    def get_authorization(self) -> str:
+        """
+        Returns authorization header.
+        """
+        return self.token_manager.get_authorization()
 
     def get_headers(self) -> dict:
         headers = super().get_headers()
 
-        headers["authorization"] = self.authorization
+        headers["authorization"] = self.get_authorization()
 
         return headers
 
+    def get_json_submissions(self, subreddit_name: str, limit: int, after: str = "null") -> dict:
+        """
+        Gets submissions, requests new token once if the current one was rejected.
+        """
+        try:
+            return super().get_json_submissions(subreddit_name, limit, after)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 401:
+                raise e
+
+            self.token_manager.refresh()
+
+            return super().get_json_submissions(subreddit_name, limit, after)
+
     def make_request_url(self, subreddit_name: str) -> str:
         return f"https://oauth.reddit.com/r/{subreddit_name}/{self.sort_type}.json"
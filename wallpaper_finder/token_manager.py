@@ -0,0 +1,127 @@
+import json
+import time
+
+import requests
+
+from threading import Lock, Timer
+
+from typing import Callable, Optional
+
+from .atomic_file import write_atomic
+
+
+class TokenManager:
+    """
+    Keeps reddit api token valid, caches it on disk and refreshes it before it expires.
+    """
+    # None disables the disk cache.
+    cache_path = None
+
+    # Token is refreshed this many seconds before it expires.
+    refresh_margin = 300
+
+    @classmethod
+    def set_cache_path(cls, path: Optional[str]) -> None:
+        """
+        Sets file where tokens are cached. None disables the cache.
+        """
+        cls.cache_path = path
+
+    def __init__(self, client_id: str, fetch_token: Callable[[], dict]) -> None:
+        """
+        client_id: cached token is used only if it was issued for this client.
+        fetch_token: requests new token, returns json with 'token_type', 'access_token', 'expires_in'.
+        """
+        self.client_id = client_id
+        self.fetch_token = fetch_token
+
+        self.authorization = None
+        self.expires_at = 0.0
+
+        self._lock = Lock()
+        self._timer = None
+
+        self._load()
+
+    def get_authorization(self) -> str:
+        """
+        Returns authorization header, requests new token only if current one is expired.
+
+        Safe to call from many threads.
+        """
+        with self._lock:
+            if self.authorization is None or time.time() >= self.expires_at:
+                self._refresh()
+
+            return self.authorization
+
+    def refresh(self) -> None:
+        """
+        Requests new token, e.g. after 401 response.
+        """
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self) -> None:
+        r_json = self.fetch_token()
+
+        self.authorization = r_json["token_type"] + " " + r_json["access_token"]
+        self.expires_at = time.time() + float(r_json.get("expires_in", 3600))
+
+        self._save()
+        self._schedule_refresh()
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh()
+        except (requests.RequestException, KeyError, ValueError):
+            # Token would be requested on the next use after it expires.
+            pass
+
+    def _schedule_refresh(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+
+        delay = max(0.0, self.expires_at - self.refresh_margin - time.time())
+
+        self._timer = Timer(delay, self._refresh_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _load(self) -> None:
+        if not self.cache_path:
+            return
+
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+
+        # Cache of an older version or edited by hand is not used, as an unreadable one.
+        try:
+            if cached.get("client_id") != self.client_id:
+                return
+
+            if time.time() >= cached["expires_at"] - self.refresh_margin:
+                return
+
+            authorization, expires_at = cached["authorization"], cached["expires_at"]
+        except (AttributeError, KeyError, TypeError):
+            return
+
+        self.authorization = authorization
+        self.expires_at = expires_at
+
+        self._schedule_refresh()
+
+    def _save(self) -> None:
+        if not self.cache_path:
+            return
+
+        cached = {"client_id": self.client_id,
+                  "authorization": self.authorization,
+                  "expires_at": self.expires_at}
+
+        # Token is a secret, only owner can read it.
+        write_atomic(self.cache_path, json.dumps(cached), 0o600)
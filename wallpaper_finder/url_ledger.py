@@ -0,0 +1,91 @@
+import sqlite3
+import time
+
+from threading import Lock
+
+from typing import Optional
+
+OUTCOMES = ("saved", "rejected", "duplicate", "failed")
+
+
+class UrlLedger:
+    """
+    Persistent record of image and post urls that were already processed.
+    """
+    # None disables the ledger.
+    ledger_path = None
+
+    # Urls with these outcomes are not loaded again.
+    skip_outcomes = set(OUTCOMES)
+
+    _known = set()
+    _pending = {}
+    _lock = Lock()
+
+    @classmethod
+    def open(cls, path: Optional[str], skip_outcomes: list = OUTCOMES) -> None:
+        """
+        Opens ledger at 'path' and loads urls with 'skip_outcomes'. None disables the ledger.
+        """
+        for outcome in skip_outcomes:
+            if outcome not in OUTCOMES:
+                raise ValueError("Passed invalid ledger outcome")
+
+        cls.ledger_path = path
+        cls.skip_outcomes = set(skip_outcomes)
+        cls._known = set()
+        cls._pending = {}
+
+        if not path:
+            return
+
+        with cls._connect() as connection:
+            cls._known = {url for url, outcome
+                          in connection.execute("SELECT url, outcome FROM urls")
+                          if outcome in cls.skip_outcomes}
+        connection.close()
+
+    @classmethod
+    def _connect(cls) -> sqlite3.Connection:
+        connection = sqlite3.connect(cls.ledger_path)
+        connection.execute("CREATE TABLE IF NOT EXISTS urls ("
+                           "url TEXT PRIMARY KEY, "
+                           "post_id TEXT, "
+                           "outcome TEXT NOT NULL, "
+                           "time REAL NOT NULL)")
+
+        return connection
+
+    @classmethod
+    def is_known(cls, url: str) -> bool:
+        """
+        Checks if 'url' was processed before and should not be loaded again.
+        """
+        return url in cls._known
+
+    @classmethod
+    def record(cls, url: str, post_id: Optional[str], outcome: str) -> None:
+        """
+        Records 'outcome' of 'url', it is written on 'save'.
+        """
+        if not cls.ledger_path:
+            return
+
+        with cls._lock:
+            cls._pending[url] = (url, post_id, outcome, time.time())
+
+    @classmethod
+    def save(cls) -> None:
+        """
+        Writes recorded outcomes to the ledger.
+        """
+        if not cls.ledger_path:
+            return
+
+        with cls._lock:
+            records = list(cls._pending.values())
+            cls._pending = {}
+
+        with cls._connect() as connection:
+            connection.executemany("INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?)", records)
+        connection.close()
@@ -4,11 +4,52 @@ from alive_progress import alive_bar
 
 from PIL import Image, UnidentifiedImageError
 
+import numpy as np
 import requests
 
 from uuid import uuid4
 
-from typing import Tuple
+from concurrent.futures import ProcessPoolExecutor
+
+from contextlib import nullcontext
+from io import BytesIO
+import hashlib
+
+from typing import BinaryIO, Callable, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
+
+from .hash_index import HashIndex
+from .content_store import ContentStore, SAVE_LAYOUTS
+from .library_scanner import LibraryScanner
+from .http_session import HttpSession
+from .image_filter import ImageFilter
+from .bk_tree import BKTree
+from .metrics import Metrics
+from .failures import HttpStatusError, InvalidImageError
+
+# Smaller batches are hashed in the main process.
+MIN_IMAGES_FOR_PROCESS_POOL = 16
+
+# Size of chunks in which downloaded images are written.
+CHUNK_SIZE = 64 * 1024
+
+# Images which header is not found in this many first bytes are rejected.
+HEADER_MAX_BYTES = 1024 * 1024
+
+DOWNLOAD_ENGINES = ("threads", "asyncio")
+
+
+class ImageInfo(NamedTuple):
+    """
+    Downloaded image.
+
+    'hash' is None if image was not decoded while saving.
+    'digest' is a digest of the saved file, None if image was re-encoded while saving.
+    """
+    path: str
+    hash: Optional[str]
+    width: int
+    height: int
+    digest: Optional[str]
 
 
 class FileUtils:
@@ -17,6 +58,27 @@ class FileUtils:
     save_folder_path = "./saved"
     number_of_threads = 4
 
+    # "threads" - "number_of_threads" threads, "asyncio" - single event loop.
+    download_engine = "threads"
+    max_connections = 100
+    max_connections_per_host = 16
+
+    number_of_processes = os.cpu_count() or 1
+
+    # Images which hashes differ by at most this number of bits are duplicates.
+    duplicate_threshold = 0
+
+    # Save downloaded bytes as is instead of re-encoding images.
+    pass_through = False
+
+    # "flat" - images are saved by name, "content" - by digest of their content.
+    save_layout = "flat"
+
+    # Hashes calculated during this run, by image path.
+    image_hashes = {}
+    # Digests of images saved as downloaded during this run, by image path.
+    image_digests = {}
+
     @classmethod
     def set_extensions(cls, extensions: list) -> None:
         """
@@ -59,56 +121,217 @@ class FileUtils:
         cls.number_of_threads = num
 
     @classmethod
-    def get_images_from_folder(cls, folder_path: str) -> list:
+    def set_download_engine(cls, engine: str) -> None:
         """
-        Returns list of paths to images that have 'ALOWED_EXTENSION' in 'folder_path'.
+        Sets engine for loading images: "threads" or "asyncio".
         """
-        folder_images = []
-        for filename in os.listdir(folder_path):
-            image_path = os.path.join(folder_path, filename)
+        if engine not in DOWNLOAD_ENGINES:
+            raise ValueError("Passed invalid download engine")
+
+        cls.download_engine = engine
 
-            if os.path.splitext(image_path)[1] in cls.allowed_extensions:
-                folder_images.append(image_path)
+    @classmethod
+    def set_connection_limits(cls, total: int, per_host: int) -> None:
+        """
+        Sets max number of concurrent connections for "asyncio" engine, total and to a single host.
+        """
+        cls.max_connections = total
+        cls.max_connections_per_host = per_host
 
-        return folder_images
+    @classmethod
+    def set_number_of_processes(cls, num: Optional[int]) -> None:
+        """
+        Sets number of processes for hashing. None means all cores.
+        """
+        cls.number_of_processes = num or os.cpu_count() or 1
 
-    def ahash(image_path: str, hashSize: int = 10) -> str:
+    @classmethod
+    def set_pass_through(cls, pass_through: bool) -> None:
         """
-        Calculates aproximate hash of image at 'image_path'.
+        Sets if downloaded images are saved as is instead of being re-encoded.
         """
-        image = Image.open(image_path).resize((hashSize, hashSize), Image.ANTIALIAS)
+        cls.pass_through = pass_through
+
+    @classmethod
+    def set_save_layout(cls, layout: str) -> None:
+        """
+        Sets layout of the save folder: "flat" or "content".
+        """
+        if layout not in SAVE_LAYOUTS:
+            raise ValueError("Passed invalid save layout")
+
+        cls.save_layout = layout
+
+    @classmethod
+    def set_duplicate_threshold(cls, threshold: int) -> None:
+        """
+        Sets max number of different hash bits for images to be duplicates.
+        """
+        if threshold < 0:
+            raise ValueError("Duplicate threshold can't be negative")
+
+        cls.duplicate_threshold = threshold
+
+    @classmethod
+    def get_images_from_folder(cls, folder_path: str) -> list:
+        """
+        Returns list of paths to images that have 'ALOWED_EXTENSION' in 'folder_path'
+        and its subfolders.
+
+        Only subfolders changed since the previous scan are listed again.
+        """
+        return LibraryScanner(folder_path).scan(cls.allowed_extensions)
+
+    def ahash(image_path: Union[str, BinaryIO], hashSize: int = 10) -> str:
+        """
+        Calculates aproximate hash of image at 'image_path' or in a file object.
+        """
+        with Image.open(image_path) as image:
+            return FileUtils.image_ahash(image, hashSize)
+
+    def image_ahash(image: Image.Image, hashSize: int = 10) -> str:
+        """
+        Calculates aproximate hash of opened or decoded 'image'.
+        """
+        size = hashSize * 4
+
+        # The same power of two scale as JPEG decoder chooses in 'draft'.
+        scale = min(image.width // size, image.height // size)
+        scale = next((s for s in (8, 4, 2) if scale >= s), 1)
+
+        # JPEG images are decoded right away at 1/2, 1/4 or 1/8 scale,
+        # other images are reduced by the same scale. Scaled JPEG decoding is close to
+        # but not exactly the same as 'reduce', so hash of a JPEG decoded fully
+        # (e.g. while re-encoding) can differ from hash of the same file by a bit or two.
+        drafted = image.draft("L", (size, size)) is not None
         image = image.convert("L")
 
-        pixel_values = list(image.getdata())
-        avg_px_val = sum(pixel_values) / len(pixel_values)
+        if not drafted and scale > 1:
+            image = image.reduce(scale)
 
-        bits = "".join(['1' if (px > avg_px_val) else "0" for px in pixel_values])
+        # Cheap box downscale before the antialiasing resize.
+        factor = min(image.size) // size
+        if factor > 1:
+            image = image.reduce(factor)
 
-        return hex(int(bits, 2))[2:]
+        image = image.resize((hashSize, hashSize), Image.ANTIALIAS)
+
+        pixel_values = np.asarray(image, dtype=np.float32).ravel()
+        bits = pixel_values > pixel_values.mean()
+
+        # packbits pads the last byte with zeros, they are shifted out.
+        value = int.from_bytes(np.packbits(bits).tobytes(), "big") >> (-bits.size % 8)
+
+        return format(value, "x")
+
+    @classmethod
+    def hash_images(cls, image_paths: list, bar: Callable[[], None] = None) -> dict:
+        """
+        Calculates hashes of images at 'image_paths' using 'number_of_processes' processes.
+
+        Returns dict of path: hash. Hash is None if image can't be read.
+        """
+        hashes = {}
+
+        if len(image_paths) < MIN_IMAGES_FOR_PROCESS_POOL or cls.number_of_processes == 1:
+            for image_path in image_paths:
+                hashes[image_path] = _hash_image(image_path)
+
+                if bar:
+                    bar()
+
+            return hashes
+
+        chunksize = max(1, len(image_paths) // (cls.number_of_processes * 4))
+
+        with ProcessPoolExecutor(cls.number_of_processes) as executor:
+            results = executor.map(_hash_image, image_paths, chunksize=chunksize)
+
+            for image_path, image_hash in zip(image_paths, results):
+                hashes[image_path] = image_hash
+
+                if bar:
+                    bar()
+
+        return hashes
+
+    @classmethod
+    def get_known_hash(cls, image_path: str, index: HashIndex = None) -> Optional[str]:
+        """
+        Returns hash of image at 'image_path' calculated during this run or stored in 'index'.
+        """
+        image_hash = cls.image_hashes.get(image_path)
+
+        if image_hash is None and index:
+            image_hash = index.get(image_path)
+
+        return image_hash
+
+    @classmethod
+    def find_original(cls, image_hash: str, hashes: dict, tree: BKTree) -> Optional[str]:
+        """
+        Returns path of image with the same hash in 'hashes'.
+
+        If there is none and 'duplicate_threshold' is set, returns path of the closest
+        image in 'tree' that differs by at most 'duplicate_threshold' bits.
+        """
+        original = hashes.get(image_hash)
+
+        if original is None and cls.duplicate_threshold:
+            match = tree.find(image_hash, cls.duplicate_threshold)
+
+            if match:
+                original, _ = match
+
+        return original
 
     @classmethod
-    def calculate_hashes(cls, images: list) -> Tuple[dict, list]:
+    def calculate_hashes(cls, images: list, index: HashIndex = None) -> Tuple[dict, list]:
         """
         Calculates hashes and finds duplicates of files in 'images'.
+
+        If 'index' is passed, hashes of unchanged files are taken from it.
         """
         duplicates = []
         hashes = {}
+        tree = BKTree()
 
         if images:
             with alive_bar(len(images), bar="filling", spinner="dots_reverse") as bar:
+                image_hashes = {}
                 for image in images:
-                    try:
-                        image_hash = cls.ahash(image)
+                    image_hashes[image] = cls.get_known_hash(image, index)
 
-                        if hashes.get(image_hash):
-                            duplicates.append((image, hashes[image_hash], ))
-                        else:
-                            hashes[image_hash] = image
+                to_calculate = [image for image in images if image_hashes[image] is None]
 
-                    except UnidentifiedImageError:
-                        duplicates.append((image, None))
+                bar(incr=len(images) - len(to_calculate))
+                Metrics.increment("hash_cache_hits", len(images) - len(to_calculate))
 
-                    bar()
+                with Metrics.timer("hash_batch_seconds"):
+                    calculated = cls.hash_images(to_calculate, bar)
+                Metrics.increment("hashed_images", len(to_calculate))
+
+                image_hashes.update(calculated)
+
+            for image in images:
+                image_hash = image_hashes[image]
+
+                if image_hash is None:
+                    duplicates.append((image, None))
+                    continue
+
+                cls.image_hashes[image] = image_hash
+                if index and image in calculated:
+                    index.set(image, image_hash)
+
+                original = cls.find_original(image_hash, hashes, tree)
+
+                if original:
+                    duplicates.append((image, original, ))
+                else:
+                    hashes[image_hash] = image
+                    if cls.duplicate_threshold:
+                        tree.add(image_hash, image)
 
         return hashes, duplicates
 
@@ -145,15 +368,24 @@ class FileUtils:
 
         if folder_images:
             print("Finding duplicates in '{}':".format(folder_name))
-        f2_hashes, f2_duplicates = cls.calculate_hashes(folder_images)
+        with HashIndex(folder) as index:
+            index.prune(folder_images)
+            f2_hashes, f2_duplicates = cls.calculate_hashes(folder_images, index)
+
+        f2_tree = BKTree()
+        if cls.duplicate_threshold:
+            for im_hash, image in f2_hashes.items():
+                f2_tree.add(im_hash, image)
 
         result = []
         duplicates = []
         print("Finding duplicates of '{}/*' in {}:".format(folder_name, string))
         with alive_bar(len(f1_hashes), bar="filling", spinner='dots_reverse') as bar:
             for im_hash in f1_hashes:
-                if f2_hashes.get(im_hash):
-                    duplicates.append((f1_hashes[im_hash], f2_hashes[im_hash]))
+                original = cls.find_original(im_hash, f2_hashes, f2_tree)
+
+                if original:
+                    duplicates.append((f1_hashes[im_hash], original))
                 else:
                     result.append(f1_hashes[im_hash])
                 bar()
@@ -173,67 +405,210 @@ class FileUtils:
         return result, duplicates
 
     @classmethod
-    def save_image_from_url(cls, url: str, name: str) -> str:
+    def get_temp_file_path(cls, name: str) -> str:
         """
-        Saves image located at 'url'.
+        Returns path in temp folder for file 'name' that did not exist yet.
+
+        Empty file is created at the path, so concurrent downloads of images
+        with the same name get different paths.
         """
-        if os.path.splitext(name)[1] not in cls.allowed_extensions:
-            raise ValueError("Invalid extension to save")
+        file_path = os.path.join(cls.temp_folder_path, name)
 
         try:
-            raw_responce = requests.get(url, stream=True).raw
-        except requests.ConnectionError:
-            raise ValueError("Failed to establish connection to url.")
+            open(file_path, "x").close()
+        except FileExistsError:
+            file_path = os.path.join(cls.temp_folder_path, str(uuid4()) + "-" + name)
+            open(file_path, "x").close()
 
-        image = Image.open(raw_responce)
+        return file_path
 
-        file_path = os.path.join(cls.temp_folder_path, name)
-        if os.path.isfile(file_path):
-            new_name = str(uuid4()) + "-" + name
-            file_path = os.path.join(cls.temp_folder_path, new_name)
+    @classmethod
+    def get_allowed_formats(cls) -> set:
+        """
+        Returns PIL formats of 'allowed_extensions'.
+        """
+        extensions = Image.registered_extensions()
+        formats = {extensions[ext] for ext in cls.allowed_extensions if ext in extensions}
+
+        # PIL opens JPEGs of many cameras as MPO, which has no extension of its own.
+        if "JPEG" in formats:
+            formats.add("MPO")
+
+        return formats
+
+    @classmethod
+    def check_image_header(cls, image_format: str, width: int, height: int) -> None:
+        """
+        Raises ValueError if image format or resolution is not allowed.
+        """
+        if image_format not in cls.get_allowed_formats():
+            raise ValueError(f"Format {image_format} is not allowed")
+
+        ImageFilter.check_resolution(width, height)
+
+    def check_length(received: int, headers: dict) -> None:
+        """
+        Raises ChunkedEncodingError if less than Content-Length bytes were received.
+
+        Connection closed in the middle of the body is a transient failure,
+        truncated image is not saved and the download is retried.
+        """
+        # Length of encoded body is not comparable with length of decoded chunks.
+        if "Content-Encoding" in headers:
+            return
 
         try:
-            image.save(file_path, icc_profile='', quality=95, subsampling=0)
+            expected = int(headers.get("Content-Length"))
+        except (TypeError, ValueError):
+            return
 
-            return file_path
-        except OSError:
-            image.convert("RGB").save(file_path, icc_profile='', quality=95, subsampling=0)
+        if received < expected:
+            raise requests.exceptions.ChunkedEncodingError(
+                f"Connection closed after {received} of {expected} bytes")
 
-            return file_path
-        except BaseException as e:
-            if os.path.isfile(file_path):
-                os.unlink(file_path)
+    def check_header(chunks: Iterable[bytes], headers: dict) -> Iterator[bytes]:
+        """
+        Yields 'chunks', checks image header as soon as it is received
+        and length of the image when all chunks are received.
+        """
+        checker = ImageHeaderChecker()
+        received = 0
+
+        for chunk in chunks:
+            Metrics.increment("downloaded_bytes", len(chunk))
+            checker.feed(chunk)
+            received += len(chunk)
+            yield chunk
+
+        FileUtils.check_length(received, headers)
+
+    @classmethod
+    def save_image_content(cls, content: bytes, file_path: str) -> ImageInfo:
+        """
+        Decodes downloaded 'content' and saves it re-encoded to 'file_path'.
+
+        Hash and size are calculated from the decoded image, so the file is not read again.
+        """
+        with Metrics.timer("decode_seconds"):
+            try:
+                image = Image.open(BytesIO(content))
+                image.load()
+            except (SyntaxError, OSError) as e:
+                raise InvalidImageError(f"Broken image: {e}")
+
+        with Metrics.timer("hash_seconds"):
+            image_hash = cls.image_ahash(image)
+
+        image_info = ImageInfo(path=file_path,
+                               hash=image_hash,
+                               width=image.width,
+                               height=image.height,
+                               digest=None)
+
+        with Metrics.timer("save_seconds"):
+            try:
+                image.save(file_path, icc_profile='', quality=95, subsampling=0)
+            except OSError:
+                image.convert("RGB").save(file_path, icc_profile='', quality=95, subsampling=0)
+
+        cls.image_hashes[file_path] = image_info.hash
+
+        return image_info
+
+    @classmethod
+    def save_image_chunks(cls, chunks: Iterable[bytes], file_path: str) -> ImageInfo:
+        """
+        Writes downloaded 'chunks' to 'file_path' as is.
+        """
+        writer = ImageFileWriter(file_path)
+
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
 
+            return writer.finish()
+        except BaseException as e:
+            writer.abort()
             raise e
 
-    def remove_files(to_remove: list) -> None:
+    @classmethod
+    def save_image_from_url(cls, url: str, file_path: str) -> ImageInfo:
+        """
+        Saves image located at 'url' to 'file_path', usually from 'get_temp_file_path'.
+
+        In 'pass_through' mode original bytes are saved, otherwise image is re-encoded.
+        """
+        if os.path.splitext(file_path)[1] not in cls.allowed_extensions:
+            raise ValueError("Invalid extension to save")
+
+        # Body is loaded only after size and header are checked,
+        # connection is closed right away if they are not allowed.
+        with HttpSession.get(url, stream=True) as response:
+            if response.status_code >= 400:
+                raise HttpStatusError(response.status_code, response.headers.get("Retry-After"))
+
+            ImageFilter.check_bytes(response.headers.get("Content-Length"))
+
+            chunks = cls.check_header(response.iter_content(CHUNK_SIZE), response.headers)
+
+            if cls.pass_through:
+                return cls.save_image_chunks(chunks, file_path)
+
+            content = b"".join(chunks)
+
+        return cls.save_image_content(content, file_path)
+
+    @classmethod
+    def remove_files(cls, to_remove: list) -> None:
         """
         Removes files in 'to_remove'.
         """
         for file_path in to_remove:
+            cls.image_hashes.pop(file_path, None)
+            cls.image_digests.pop(file_path, None)
             try:
                 os.unlink(file_path)
             except FileNotFoundError:
                 continue
 
-    def move_images(paths: list, folder: str, verbose: bool = False) -> list:
+    @classmethod
+    def move_images(cls, paths: list, folder: str, verbose: bool = False) -> list:
         """
         Moves images with 'paths' to 'folder'.
+
+        With "content" 'save_layout' images are moved by digest of their content
+        and images with the same content as a saved one are not moved.
+
+        Already calculated hashes of moved images are added to the folder hash index.
         """
         # for already existing files
         files_existed = []
 
         if paths:
             print("Moving images: ")
-            with alive_bar(len(paths), bar="classic", spinner="dots_recur") as bar:
+            store = ContentStore(folder) if cls.save_layout == "content" else nullcontext()
+
+            with alive_bar(len(paths), bar="classic", spinner="dots_recur") as bar, \
+                    HashIndex(folder) as index, store:
 
                 for path in paths:
+                    digest = cls.image_digests.pop(path, None)
                     try:
-                        file_name = os.path.basename(path)
+                        if cls.save_layout == "content":
+                            destination = store.add(path, digest)
+
+                            if destination is None:
+                                raise FileExistsError
+                        else:
+                            file_name = os.path.basename(path)
 
-                        destination = os.path.join(folder, file_name)
+                            destination = os.path.join(folder, file_name)
 
-                        os.rename(path, destination)
+                            os.rename(path, destination)
+
+                        image_hash = cls.image_hashes.pop(path, None)
+                        if image_hash is not None:
+                            index.set(destination, image_hash)
 
                     except FileExistsError:
                         files_existed.append(path)
@@ -249,3 +624,99 @@ class FileUtils:
                     print()
 
         return files_existed
+
+
+def _hash_image(image_path: str) -> Optional[str]:
+    """
+    Process pool worker, returns None for images that can't be read.
+    """
+    try:
+        return FileUtils.ahash(image_path)
+    except (UnidentifiedImageError, OSError):
+        return None
+
+
+class ImageHeaderChecker:
+    def __init__(self) -> None:
+        """
+        Checks format and resolution of image that is being downloaded
+        as soon as its header is received, pixels are not decoded.
+        """
+        self.header = bytearray()
+        self.checked = False
+
+    def feed(self, chunk: bytes) -> None:
+        """
+        Adds next chunk of the image. Raises ValueError if image is not allowed.
+        """
+        if self.checked:
+            return
+
+        self.header += chunk
+
+        try:
+            with Image.open(BytesIO(self.header)) as image:
+                image_format, (width, height) = image.format, image.size
+        # Header that is not fully received yet is either not identified
+        # or cut off in the middle of a segment (e.g. EXIF or ICC profile).
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            if len(self.header) >= HEADER_MAX_BYTES:
+                raise ValueError("Can't read image header")
+
+            return
+
+        self.checked = True
+        self.header = None
+
+        FileUtils.check_image_header(image_format, width, height)
+
+
+class ImageFileWriter:
+    def __init__(self, file_path: str) -> None:
+        """
+        Writes image downloaded by chunks to 'file_path' without decoding it.
+        """
+        self.path = file_path
+        self.file = open(self.path, "wb")
+        self.digest = hashlib.blake2b(digest_size=16)
+
+    def write(self, chunk: bytes) -> None:
+        """
+        Writes next chunk of the image.
+        """
+        self.digest.update(chunk)
+        self.file.write(chunk)
+
+    def finish(self) -> ImageInfo:
+        """
+        Closes the file and checks it is an image of allowed format.
+
+        Only headers are read, pixels are not decoded.
+        """
+        self.file.close()
+
+        try:
+            with Metrics.timer("verify_seconds"), Image.open(self.path) as image:
+                if image.format not in FileUtils.get_allowed_formats():
+                    raise ValueError(f"Format {image.format} is not allowed")
+
+                width, height = image.size
+                image.verify()
+        except (SyntaxError, OSError) as e:
+            raise InvalidImageError(f"Broken image: {e}")
+
+        image_info = ImageInfo(path=self.path,
+                               hash=None,
+                               width=width,
+                               height=height,
+                               digest=self.digest.hexdigest())
+
+        FileUtils.image_digests[self.path] = image_info.digest
+
+        return image_info
+
+    def abort(self) -> None:
+        """
+        Closes the file, partially written file is removed by owner of the path.
+        """
+        self.file.close()